@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import time
+
+import numpy as np
+import requests
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from benchmarks.synthetic import synthetic_games
+from src.db import Database
+from src.embeddings import EmbeddingService
+from src.qdrant import COLLECTION_PROFILES, Qdrant
+
+DB_PATH = "game-library.db"
+COLLECTION_NAME = "benchmark_profiles"
+QUERIES = 200
+INDEX_TIMEOUT = 600
+
+
+def stored_games():
+    games = []
+    if os.path.exists(DB_PATH):
+        db = Database(DB_PATH)
+        try:
+            games = [
+                game
+                for with_expansions in [False, True]
+                for batch in db.iter_games(with_expansions=with_expansions)
+                for game in batch
+            ]
+        finally:
+            db.close()
+    if games:
+        return games, "stored games"
+    return synthetic_games(2000), "synthetic games"
+
+
+def queries(games, embeddings: EmbeddingService) -> np.ndarray:
+    # like the genres of a chat request, a few classification names at once
+    names = sorted(
+        {
+            classification.name
+            for game in games
+            for classification in game.types + game.categories + game.mechanisms
+        }
+    )
+    rng = np.random.default_rng(7)
+    texts = [
+        ", ".join(rng.choice(names, size=min(3, len(names)), replace=False))
+        for _ in range(QUERIES)
+    ]
+    return embeddings.encode(texts)
+
+
+def estimated_memory(profile, dimension: int, payload_size: float) -> float:
+    # bytes per point kept in memory, following the Qdrant capacity planning
+    size = 0 if profile.on_disk else dimension * 4
+    if profile.quantization == "scalar":
+        size += dimension
+    elif profile.quantization == "binary":
+        size += dimension / 8
+    size += profile.hnsw_m * 2 * 4
+    if not profile.on_disk_payload:
+        size += payload_size
+    return size
+
+
+def main():
+    try:
+        requests.get("http://localhost:6333").raise_for_status()
+    except requests.RequestException as e:
+        print(f"Docker Container Qdrant is not running: {e}")
+        return
+    client = QdrantClient(host="localhost", port=6333)
+
+    games, source = stored_games()
+    embeddings = EmbeddingService()
+    vectors = embeddings.encode([game.data_for_vectorization for game in games])
+    query_vectors = queries(games, embeddings)
+    dimension = vectors.shape[1]
+    print(f"{len(games)} {source}, {QUERIES} queries, top {Qdrant.limit}")
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = query_vectors @ normalized.T
+    ids = np.array([game.bgg_id for game in games])
+    expected = [
+        set(ids[np.argsort(-query_scores)[: Qdrant.limit]]) for query_scores in scores
+    ]
+    payloads = [game.to_dict(show_description=False) for game in games]
+    payload_size = sum(len(json.dumps(payload)) for payload in payloads) / len(games)
+
+    for name, profile in COLLECTION_PROFILES.items():
+        store = Qdrant(client, None)
+        store.collection_name = COLLECTION_NAME
+        store.profile = profile
+        if client.collection_exists(COLLECTION_NAME):
+            client.delete_collection(COLLECTION_NAME)
+        client.create_collection(
+            COLLECTION_NAME,
+            vectors_config=profile.vectors_config(dimension),
+            hnsw_config=profile.hnsw_config(),
+            quantization_config=profile.quantization_config(),
+            on_disk_payload=profile.on_disk_payload,
+            # the threshold is in KB, a low one indexes the segments of the
+            # small collection too, 0 would turn indexing off
+            optimizers_config={"indexing_threshold": 10},
+        )
+        start = time.perf_counter()
+        points = [
+            PointStruct(id=game.bgg_id, vector=vector.tolist(), payload=payload)
+            for game, vector, payload in zip(games, vectors, payloads)
+        ]
+        for i in range(0, len(points), Qdrant.batch_size):
+            client.upsert(
+                COLLECTION_NAME, points=points[i : i + Qdrant.batch_size], wait=True
+            )
+        # searches before the graph is built would scan all vectors
+        deadline = time.monotonic() + INDEX_TIMEOUT
+        while True:
+            info = client.get_collection(COLLECTION_NAME)
+            if info.status == "green" and (info.indexed_vectors_count or 0) >= len(
+                points
+            ):
+                break
+            if time.monotonic() > deadline:
+                client.delete_collection(COLLECTION_NAME)
+                raise TimeoutError(
+                    f"{name}: {info.indexed_vectors_count or 0} of {len(points)} "
+                    f"vectors indexed after {INDEX_TIMEOUT}s, status {info.status}"
+                )
+            time.sleep(0.1)
+        build = time.perf_counter() - start
+
+        latencies, recall = [], 0.0
+        for query_vector, expected_ids in zip(query_vectors, expected):
+            start = time.perf_counter()
+            results = store.client_search(None, query_vector.tolist())
+            latencies.append((time.perf_counter() - start) * 1000)
+            recall += len({point.id for point in results} & expected_ids) / len(
+                expected_ids
+            )
+        latencies.sort()
+        memory = estimated_memory(profile, dimension, payload_size) * len(games)
+        print(
+            f"{name}: recall {recall / QUERIES:.3f}, "
+            f"{latencies[len(latencies) // 2]:.2f} ms p50 "
+            f"{latencies[int(len(latencies) * 0.95)]:.2f} ms p95, "
+            f"~{memory / 1024 / 1024:.1f} MiB in memory (estimated), "
+            f"built in {build:.1f}s"
+        )
+    client.delete_collection(COLLECTION_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import synthetic_games
+from src.db import Database
+
+SIZES = [10_000, 100_000]
+PAGE_SIZE = 500
+
+
+def main():
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as directory:
+            db = Database(os.path.join(directory, "game-library.db"))
+            db.create_tables()
+            games = synthetic_games(size)
+            for i in range(0, size, 1000):
+                db.insert_data(games[i : i + 1000])
+            del games
+
+            start = time.perf_counter()
+            loaded = db.get_games()
+            duration = time.perf_counter() - start
+            print(f"{size} games: get_games {duration:.2f}s for {len(loaded)} games")
+
+            start = time.perf_counter()
+            pages, after_id = 0, None
+            while page := db.get_games(after_id=after_id, limit=PAGE_SIZE):
+                after_id = page[-1].bgg_id
+                pages += 1
+            duration = time.perf_counter() - start
+            print(
+                f"{size} games: {pages} pages of {PAGE_SIZE} in {duration:.2f}s "
+                f"({duration / pages * 1000:.1f} ms per page)"
+            )
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import os
+import sqlite3
+import tempfile
+import time
+from typing import List
+
+from benchmarks.synthetic import synthetic_games
+from src.db import Database
+from src.models import Game
+
+GAMES = 10_000
+BATCH_SIZE = 32
+
+
+class RowByRowDatabase:
+    # the write path before the bulk upsert, with the original SQL unchanged,
+    # on its own connection with the default or with the current pragmas
+    def __init__(self, path: str, pragmas: bool = False):
+        self.conn = sqlite3.connect(path)
+        if pragmas:
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.row_factory = sqlite3.Row
+        self.db_cursor = self.conn.cursor()
+
+    def close(self):
+        self.conn.close()
+
+    def insert_data(self, games: List[Game]):
+        for game in games:
+            self._insert_game(game)
+            self._insert_classifications(game.types, "type", "game_type", game.bgg_id)
+            self._insert_classifications(
+                game.categories, "category", "game_category", game.bgg_id
+            )
+            self._insert_classifications(
+                game.mechanisms, "mechanism", "game_mechanism", game.bgg_id
+            )
+            self.conn.commit()
+
+    def _insert_game(self, game: Game):
+        self.db_cursor.execute("SELECT * FROM game WHERE bgg_id = ?", (game.bgg_id,))
+        if self.db_cursor.fetchone():
+            self.db_cursor.execute(
+                "UPDATE game SET title = ?, description = ?, year = ?, bgg_rating = ?, complexity = ?, bgg_url = ?, image_url = ?, expansion = ?, min_players = ?, max_players = ?, min_playtime = ?, max_playtime = ? WHERE bgg_id = ?",
+                (
+                    game.title,
+                    game.description,
+                    game.year,
+                    game.bgg_rating,
+                    game.complexity,
+                    game.bgg_url,
+                    game.image_url,
+                    game.expansion,
+                    game.min_players,
+                    game.max_players,
+                    game.min_playtime,
+                    game.max_playtime,
+                    game.bgg_id,
+                ),
+            )
+        else:
+            self.db_cursor.execute(
+                "INSERT INTO game (bgg_id, title, description, year, bgg_rating, complexity, bgg_url, image_url, expansion, min_players, max_players, min_playtime, max_playtime) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    game.bgg_id,
+                    game.title,
+                    game.description,
+                    game.year,
+                    game.bgg_rating,
+                    game.complexity,
+                    game.bgg_url,
+                    game.image_url,
+                    game.expansion,
+                    game.min_players,
+                    game.max_players,
+                    game.min_playtime,
+                    game.max_playtime,
+                ),
+            )
+
+    def _insert_classifications(
+        self, classifications, table_name, link_table_name, game_id
+    ):
+
+        for classification in classifications:
+            # classification insert/update
+            self.db_cursor.execute(
+                f"SELECT * FROM {table_name} WHERE bgg_id = ?", (classification.bgg_id,)
+            )
+            if not self.db_cursor.fetchone():
+                self.db_cursor.execute(
+                    f"INSERT INTO {table_name} (bgg_id, name, bgg_url, description) VALUES (?, ?, ?, ?)",
+                    (
+                        classification.bgg_id,
+                        classification.name,
+                        classification.bgg_url,
+                        classification.description,
+                    ),
+                )
+            else:
+                self.db_cursor.execute(
+                    f"UPDATE {table_name} SET name = ?, bgg_url = ?, description = ? WHERE bgg_id = ?",
+                    (
+                        classification.name,
+                        classification.bgg_url,
+                        classification.description,
+                        classification.bgg_id,
+                    ),
+                )
+
+            # Many-To-Many relationship between games and classifications
+            self.db_cursor.execute(
+                f"SELECT * FROM {link_table_name} WHERE game_id = ? AND {table_name}_id = ?",
+                (game_id, classification.bgg_id),
+            )
+            if not self.db_cursor.fetchone():
+                self.db_cursor.execute(
+                    f"INSERT INTO {link_table_name} (game_id, {table_name}_id) VALUES (?, ?)",
+                    (game_id, classification.bgg_id),
+                )
+
+
+def run(name: str, games, open_database) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "game-library.db")
+        # the current schema, the original statements only use its columns
+        schema = Database(path)
+        schema.create_tables()
+        schema.close()
+        db = open_database(path)
+        start = time.perf_counter()
+        for i in range(0, len(games), BATCH_SIZE):
+            db.insert_data(games[i : i + BATCH_SIZE])
+        duration = time.perf_counter() - start
+        db.close()
+    print(f"{name}: {duration:.2f}s ({len(games) / duration:.0f} games/s)")
+    return duration
+
+
+def main():
+    games = synthetic_games(GAMES)
+    original = run("row by row, default pragmas", games, RowByRowDatabase)
+    pragmas = run(
+        "row by row, WAL and synchronous NORMAL",
+        games,
+        lambda path: RowByRowDatabase(path, pragmas=True),
+    )
+    bulk = run("bulk upsert, WAL and synchronous NORMAL", games, Database)
+    print(f"pragmas: {original / pragmas:.1f}x faster")
+    print(f"bulk upsert: {pragmas / bulk:.1f}x faster with the same pragmas")
+    print(f"together: {original / bulk:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import hashlib
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_games
+from src.embeddings import EmbeddingCache, EmbeddingService
+from src.qdrant import Qdrant
+
+GAMES = 10_000
+SHARED_KEYS = 2_000
+SHARED_DIMENSION = 384
+SHARED_PROCESSES = 4
+
+
+def shared_vector(key: str) -> np.ndarray:
+    # every process writes the same vector for a key, derived from the key
+    seed = int(key[:8], 16)
+    return np.random.default_rng(seed).normal(size=SHARED_DIMENSION)
+
+
+def fill_shared_cache(args):
+    directory, worker = args
+    # overlapping ranges, so the processes also race on the same keys
+    keys = [
+        hashlib.sha256(str(i).encode("utf-8")).hexdigest()
+        for i in range(worker * SHARED_KEYS // 2, (worker + 2) * SHARED_KEYS // 2)
+    ]
+    cache = EmbeddingCache(directory, "shared", "float32")
+    for i in range(0, len(keys), 16):
+        batch = keys[i : i + 16]
+        cache.put(batch, np.array([shared_vector(key) for key in batch]))
+    return len(keys)
+
+
+def check_shared_cache() -> bool:
+    # several ingests append to one cache, every key has to keep its own vector
+    with tempfile.TemporaryDirectory() as directory:
+        with Pool(SHARED_PROCESSES) as pool:
+            pool.map(
+                fill_shared_cache,
+                [(directory, worker) for worker in range(SHARED_PROCESSES)],
+            )
+        cache = EmbeddingCache(directory, "shared", "float32")
+        expected = (SHARED_PROCESSES + 1) * SHARED_KEYS // 2
+        vectors = cache.get(list(cache.rows))
+        wrong = sum(
+            1
+            for key, vector in vectors.items()
+            if not np.allclose(vector, shared_vector(key), atol=1e-6)
+        )
+        print(
+            f"shared cache: {len(vectors)} of {expected} keys from "
+            f"{SHARED_PROCESSES} processes, {wrong} with a wrong vector"
+        )
+        return len(vectors) == expected and wrong == 0
+
+
+def main():
+    texts = [game.data_for_vectorization for game in synthetic_games(GAMES)]
+    with tempfile.TemporaryDirectory() as directory:
+        EmbeddingService.cache_dir = directory
+        for run in ["empty cache", "filled cache"]:
+            embeddings = EmbeddingService()
+            start = time.perf_counter()
+            for i in range(0, len(texts), Qdrant.batch_size):
+                embeddings.encode(texts[i : i + Qdrant.batch_size])
+            duration = time.perf_counter() - start
+            print(f"{run}: {len(texts) / duration:.0f} texts/s")
+            embeddings.report()
+    if not check_shared_cache():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_games
+from src.db import Database
+from src.encoder import ONNX_FILES, create_encoder
+
+# lowest cosine similarity to the torch embedding a backend may produce
+PARITY_MIN = float(os.environ.get("ENCODER_PARITY_MIN", 0.98))
+BATCH_SIZE = 64
+DB_PATH = "game-library.db"
+QUERIES = 100
+
+
+def stored_texts():
+    texts = []
+    if os.path.exists(DB_PATH):
+        db = Database(DB_PATH)
+        try:
+            texts = [
+                game.data_for_vectorization
+                for with_expansions in [False, True]
+                for games in db.iter_games(with_expansions=with_expansions)
+                for game in games
+            ]
+        finally:
+            db.close()
+    if texts:
+        return texts, "stored games"
+    return [game.data_for_vectorization for game in synthetic_games(2000)], (
+        "synthetic games"
+    )
+
+
+def measure(encoder, texts):
+    start = time.perf_counter()
+    vectors = encoder.encode(texts, batch_size=BATCH_SIZE)
+    throughput = len(texts) / (time.perf_counter() - start)
+    latencies = []
+    for text in texts[:QUERIES]:
+        start = time.perf_counter()
+        encoder.encode(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return np.asarray(vectors), throughput, latencies
+
+
+def main():
+    texts, source = stored_texts()
+    print(f"{len(texts)} texts of {source}")
+
+    failed = False
+    reference = None
+    for backend in ["torch", *ONNX_FILES]:
+        start = time.perf_counter()
+        try:
+            encoder = create_encoder(backend)
+        except (EnvironmentError, ImportError) as e:
+            print(f"{backend}: {e}")
+            continue
+        load_time = time.perf_counter() - start
+        vectors, throughput, latencies = measure(encoder, texts)
+        print(
+            f"{backend}: loaded in {load_time:.2f}s, {throughput:.0f} texts/s, "
+            f"{latencies[len(latencies) // 2]:.1f} ms p50 "
+            f"{latencies[int(len(latencies) * 0.95)]:.1f} ms p95 per query"
+        )
+        if reference is None:
+            reference = vectors
+            continue
+        cosine = (reference * vectors).sum(axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1)
+        )
+        print(
+            f"{backend}: cosine to torch {cosine.mean():.5f} mean, "
+            f"{cosine.min():.5f} min"
+        )
+        if cosine.min() < PARITY_MIN:
+            print(f"{backend}: parity below {PARITY_MIN}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import json
+import time
+
+import numpy as np
+import requests
+from qdrant_client import QdrantClient, models
+from qdrant_client.models import PointStruct
+
+from benchmarks.synthetic import synthetic_games
+from src.qdrant import PAYLOAD_SCHEMA, Qdrant
+
+SIZES = [10_000, 100_000]
+DIMENSION = 384
+QUERIES = 100
+COLLECTION_NAME = "benchmark_filtered_search"
+NUMERIC_FIELDS = [
+    field_name
+    for field_name, field_schema in PAYLOAD_SCHEMA.items()
+    if field_schema != models.PayloadSchemaType.KEYWORD
+]
+# the filter of a chat request for 4 players, 60 minutes, complexity 3 and two genres
+FILTER = models.Filter(
+    must=[
+        models.Filter(
+            must=[
+                models.FieldCondition(key="max_players", range=models.Range(gte=4)),
+                models.FieldCondition(key="min_playtime", range=models.Range(lte=60)),
+            ]
+        ),
+        models.Filter(
+            should=[
+                models.FieldCondition(
+                    key="complexity", range=models.Range(gte=2, lte=4)
+                ),
+                models.IsEmptyCondition(is_empty=models.PayloadField(key="complexity")),
+            ]
+        ),
+        models.Filter(
+            should=[
+                models.FieldCondition(
+                    key=key, match=models.MatchAny(any=["Category 3", "Mechanism 7"])
+                )
+                for key in ["types", "categories", "mechanisms"]
+            ]
+        ),
+    ]
+)
+
+
+def payloads(size: int, typed: bool):
+    for game in synthetic_games(size):
+        payload = game.to_dict(show_description=not typed)
+        if not typed:
+            # the previous payload kept the scraped strings
+            for field_name in NUMERIC_FIELDS:
+                if payload[field_name] is not None:
+                    payload[field_name] = str(payload[field_name])
+        yield game.bgg_id, payload
+
+
+def fill(client: QdrantClient, size: int, typed: bool, indexed: bool) -> float:
+    client.recreate_collection(
+        COLLECTION_NAME,
+        vectors_config=models.VectorParams(
+            size=DIMENSION, distance=models.Distance.COSINE
+        ),
+    )
+    if indexed:
+        for field_name, field_schema in PAYLOAD_SCHEMA.items():
+            client.create_payload_index(
+                COLLECTION_NAME, field_name=field_name, field_schema=field_schema
+            )
+    rng = np.random.default_rng(42)
+    points, payload_size = [], 0
+    for bgg_id, payload in payloads(size, typed):
+        payload_size += len(json.dumps(payload))
+        points.append(
+            PointStruct(
+                id=bgg_id, vector=rng.normal(size=DIMENSION).tolist(), payload=payload
+            )
+        )
+        if len(points) == Qdrant.batch_size:
+            client.upsert(COLLECTION_NAME, points=points, wait=True)
+            points = []
+    if points:
+        client.upsert(COLLECTION_NAME, points=points, wait=True)
+    return payload_size / size
+
+
+def measure(client: QdrantClient):
+    rng = np.random.default_rng(7)
+    latencies = []
+    for _ in range(QUERIES):
+        start = time.perf_counter()
+        client.search(
+            COLLECTION_NAME,
+            query_vector=rng.normal(size=DIMENSION).tolist(),
+            query_filter=FILTER,
+            limit=Qdrant.limit,
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    try:
+        requests.get("http://localhost:6333").raise_for_status()
+    except requests.RequestException as e:
+        print(f"Docker Container Qdrant is not running: {e}")
+        return
+    client = QdrantClient(host="localhost", port=6333)
+    variants = [
+        ("string payload", False, False),
+        ("typed payload", True, False),
+        ("typed payload with indexes", True, True),
+    ]
+    for size in SIZES:
+        for name, typed, indexed in variants:
+            payload_size = fill(client, size, typed, indexed)
+            p50, p95 = measure(client)
+            print(
+                f"{size} games, {name}: {payload_size:.0f} payload bytes per game, "
+                f"filtered search {p50:.2f} ms p50 {p95:.2f} ms p95"
+            )
+    client.delete_collection(COLLECTION_NAME)
+
+
+if __name__ == "__main__":
+    main()
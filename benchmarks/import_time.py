@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+
+MAIN = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py"
+)
+# seconds of imports ./main.py --help may spend before argparse runs
+BUDGET = float(os.environ.get("STARTUP_IMPORT_BUDGET", 0.15))
+HEAVY_MODULES = [
+    "bs4",
+    "lxml",
+    "openai",
+    "qdrant_client",
+    "requests",
+    "selenium",
+    "sentence_transformers",
+    "torch",
+]
+
+
+def import_times(args):
+    # python -X importtime writes "self us | cumulative us | package" to stderr
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN, *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    times = {}
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        modules.add(module.strip().split(".")[0])
+        if not module.startswith("  "):
+            # only top level imports, the nested ones are part of the cumulative time
+            times[module.strip()] = int(cumulative) / 1_000_000
+    return times, modules
+
+
+def main():
+    times, modules = import_times(["--help"])
+    total = sum(times.values())
+    for module, duration in sorted(times.items(), key=lambda item: -item[1])[:10]:
+        print(f"{duration * 1000:8.1f} ms  {module}")
+    print(f"--help imports: {total:.3f}s (budget {BUDGET:.3f}s)")
+
+    errors = []
+    heavy = [module for module in HEAVY_MODULES if module in modules]
+    if heavy:
+        errors.append(f"--help imports {', '.join(heavy)}")
+    if total > BUDGET:
+        errors.append(f"--help import time {total:.3f}s exceeds {BUDGET:.3f}s")
+    for error in errors:
+        print(error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
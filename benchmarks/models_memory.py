@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import synthetic_games
+from src.db import Database
+
+SIZE = 100_000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "game-library.db"))
+        db.create_tables()
+        games = synthetic_games(SIZE)
+        for i in range(0, SIZE, 1000):
+            db.insert_data(games[i : i + 1000])
+        del games
+        gc.collect()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        loaded = db.get_games()
+        duration = time.perf_counter() - start
+        gc.collect()
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        classifications = {
+            id(classification)
+            for game in loaded
+            for classification in game.types + game.categories + game.mechanisms
+        }
+        print(f"{len(loaded)} games loaded in {duration:.2f}s")
+        print(
+            f"{size / 1024 / 1024:.1f} MiB retained, {peak / 1024 / 1024:.1f} MiB peak, "
+            f"{size / len(loaded):.0f} bytes per game"
+        )
+        print(f"{len(classifications)} classification instances")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import time
+
+import lxml.html
+
+from src.cache import PageCache
+from src.parser import parsers
+
+BGG_DOMAIN = "https://boardgamegeek.com"
+DETAIL_URL = re.compile(rf"^{BGG_DOMAIN}/boardgame(?:expansion)?/(\d+)(?:/[^/]+)?$")
+
+
+def recorded_pages(cache: PageCache):
+    pages = []
+    for url in cache.urls():
+        match = DETAIL_URL.match(url)
+        if not match:
+            continue
+        detail = cache.get(url)
+        credits = cache.get(f"{url}/credits")
+        if detail and credits:
+            pages.append(
+                (
+                    int(match.group(1)),
+                    "",
+                    url,
+                    detail.content,
+                    credits.content,
+                    BGG_DOMAIN,
+                )
+            )
+    return pages
+
+
+def trimmed(content: str) -> str:
+    # scripts, styles and icons are not parsed, the rest of the page stays
+    document = lxml.html.fromstring(content)
+    for element in document.xpath("//script | //style | //noscript | //svg | //link"):
+        element.drop_tree()
+    return lxml.html.tostring(document, encoding="unicode", doctype="<!DOCTYPE html>")
+
+
+def export(pages, path: str):
+    os.makedirs(path, exist_ok=True)
+    for bgg_id, _, _, detail, credits, _ in pages:
+        for file_name, content in [
+            (f"{bgg_id}.html", detail),
+            (f"{bgg_id}_credits.html", credits),
+        ]:
+            with open(os.path.join(path, file_name), "w", encoding="utf-8") as file:
+                file.write(trimmed(content))
+    print(f"Exported {len(pages)} pages to {path}")
+
+
+def main():
+    pages = recorded_pages(PageCache(offline=True))
+    if not pages:
+        print("No recorded detail pages found, run ./main.py db -b selenium first")
+        sys.exit(1)
+    if len(sys.argv) == 3 and sys.argv[1] == "--export":
+        export(pages, sys.argv[2])
+        return
+
+    results = {}
+    for name, parse in parsers.items():
+        start = time.perf_counter()
+        results[name] = [parse(*page) for page in pages]
+        duration = time.perf_counter() - start
+        print(f"{name}: {duration / len(pages) * 1000:.2f} ms per page")
+
+    mismatches = 0
+    for page, reference, record in zip(pages, results["soup"], results["lxml"]):
+        if reference == record:
+            continue
+        mismatches += 1
+        for key, value in reference[0].items():
+            if record[0][key] != value:
+                print(f"{page[2]} {key}: {value!r} != {record[0][key]!r}")
+
+    print(f"{len(pages) - mismatches} of {len(pages)} pages parsed identically")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+from qdrant_client.models import PointStruct
+
+from benchmarks.synthetic import synthetic_games
+from src.qdrant import QDRANT_GRPC_PORT, QDRANT_HOST, QDRANT_PORT, Qdrant
+
+SIZE = 20_000
+DIMENSION = 384
+QUERIES = 100
+COLLECTION_NAME = "benchmark_transport"
+
+
+def points():
+    rng = np.random.default_rng(42)
+    vectors = rng.normal(size=(SIZE, DIMENSION)).astype(np.float32)
+    return [
+        PointStruct(
+            id=game.bgg_id,
+            vector=vector.tolist(),
+            payload=game.to_dict(show_description=False),
+        )
+        for game, vector in zip(synthetic_games(SIZE), vectors)
+    ]
+
+
+def measure(client: QdrantClient, label: str, size_points, workers: int):
+    client.recreate_collection(
+        COLLECTION_NAME,
+        vectors_config=models.VectorParams(
+            size=DIMENSION, distance=models.Distance.COSINE
+        ),
+    )
+    store = Qdrant(client, None)
+    store.collection_name = store.write_name = COLLECTION_NAME
+    store.upload_workers = workers
+    start = time.perf_counter()
+    for i in range(0, SIZE, Qdrant.batch_size):
+        store.upload(size_points[i : i + Qdrant.batch_size])
+    store.wait_uploads()
+    duration = time.perf_counter() - start
+
+    latencies = []
+    for query in np.random.default_rng(7).normal(size=(QUERIES, DIMENSION)):
+        start = time.perf_counter()
+        store.client_search(None, query.tolist())
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(
+        f"{label}, {workers} upload workers: {SIZE / duration:.0f} points/s, "
+        f"search {latencies[len(latencies) // 2]:.2f} ms p50 "
+        f"{latencies[int(len(latencies) * 0.95)]:.2f} ms p95"
+    )
+
+
+def main():
+    size_points = points()
+    for label, prefer_grpc in [("REST", False), ("gRPC", True)]:
+        client = QdrantClient(
+            host=QDRANT_HOST,
+            port=QDRANT_PORT,
+            grpc_port=QDRANT_GRPC_PORT,
+            prefer_grpc=prefer_grpc,
+        )
+        try:
+            client.get_collections()
+        except Exception as e:
+            print(f"Docker Container Qdrant is not running: {e}")
+            return
+        for workers in [0, 2, 4]:
+            measure(client, label, size_points, workers)
+        client.delete_collection(COLLECTION_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+import time
+
+MAIN = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py"
+)
+PROMPT = "What are you looking for today?"
+RUNS = 5
+
+
+def time_help() -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, MAIN, "--help"], check=True, stdout=subprocess.DEVNULL
+    )
+    return time.perf_counter() - start
+
+
+def time_first_prompt() -> float:
+    # needs the Qdrant container and an OpenAI key or a local chat model
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-u", MAIN, "chat"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        for line in process.stdout:
+            if PROMPT in line:
+                return time.perf_counter() - start
+        raise RuntimeError(f"chat exited before the first prompt ({process.wait()})")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    for name, measure in [("--help", time_help), ("chat", time_first_prompt)]:
+        try:
+            durations = sorted(measure() for _ in range(RUNS))
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"{name}: {e}")
+            continue
+        print(
+            f"{name}: {durations[len(durations) // 2]:.2f}s median, "
+            f"{durations[0]:.2f}s min of {RUNS} runs"
+        )
+
+
+if __name__ == "__main__":
+    main()
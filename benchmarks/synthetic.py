@@ -0,0 +1,44 @@
+import random
+from typing import List
+
+from src.models import Category, Game, Mechanism, Type
+
+TYPES = [
+    Type(5490 + i, f"Type {i}", f"/boardgamesubdomain/{5490 + i}") for i in range(8)
+]
+CATEGORIES = [
+    Category(1000 + i, f"Category {i}", f"/boardgamecategory/{1000 + i}")
+    for i in range(84)
+]
+MECHANISMS = [
+    Mechanism(2000 + i, f"Mechanism {i}", f"/boardgamemechanic/{2000 + i}")
+    for i in range(192)
+]
+
+
+def synthetic_games(count: int, seed: int = 42) -> List[Game]:
+    rng = random.Random(seed)
+    games = []
+    for bgg_id in range(1, count + 1):
+        min_players = rng.randint(1, 3)
+        min_playtime = rng.choice([15, 30, 45, 60, 90, 120])
+        game = Game(
+            bgg_id=bgg_id,
+            title=f"Game {bgg_id}",
+            description=" ".join(f"word{rng.randint(0, 999)}" for _ in range(120)),
+            year=str(rng.randint(1980, 2024)),
+            bgg_rating=f"{rng.uniform(5, 9):.1f}",
+            complexity=f"{rng.uniform(1, 5):.2f}",
+            bgg_url=f"https://boardgamegeek.com/boardgame/{bgg_id}",
+            image_url=f"https://cf.geekdo-images.com/{bgg_id}.jpg",
+            min_players=str(min_players),
+            max_players=str(min_players + rng.randint(0, 5)),
+            min_playtime=str(min_playtime),
+            max_playtime=str(min_playtime + rng.choice([0, 30, 60])),
+            types=rng.sample(TYPES, rng.randint(1, 2)),
+            categories=rng.sample(CATEGORIES, rng.randint(1, 5)),
+            mechanisms=rng.sample(MECHANISMS, rng.randint(1, 8)),
+            expansion=rng.random() < 0.1,
+        )
+        games.append(game)
+    return games
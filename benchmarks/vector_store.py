@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import requests
+from qdrant_client import QdrantClient, models
+from qdrant_client.models import PointStruct
+
+from benchmarks.synthetic import synthetic_games
+from src.db import Database
+from src.local_store import LocalVectorStore
+from src.qdrant import Qdrant
+
+SIZES = [1_000, 10_000, 100_000]
+DIMENSION = 384
+QUERIES = 100
+FILTER = models.Filter(
+    must=[
+        models.FieldCondition(key="max_players", range=models.Range(gte=4)),
+        models.FieldCondition(key="min_playtime", range=models.Range(lte=60)),
+        models.Filter(
+            should=[
+                models.FieldCondition(
+                    key="categories",
+                    match=models.MatchAny(any=["Category 3", "Category 7"]),
+                ),
+                models.FieldCondition(
+                    key="mechanisms", match=models.MatchAny(any=["Mechanism 1"])
+                ),
+            ]
+        ),
+    ]
+)
+
+NO_MATCH = models.Filter(
+    must=[models.FieldCondition(key="min_players", range=models.Range(gte=100))]
+)
+
+
+def points(size: int):
+    rng = np.random.default_rng(42)
+    vectors = rng.normal(size=(size, DIMENSION)).astype(np.float32)
+    return [
+        PointStruct(
+            id=game.bgg_id,
+            vector=vector.tolist(),
+            payload={**game.to_dict(), "content_hash": game.content_hash},
+        )
+        for game, vector in zip(synthetic_games(size), vectors)
+    ]
+
+
+def measure(name: str, store: Qdrant, size: int):
+    queries = np.random.default_rng(7).normal(size=(QUERIES, DIMENSION))
+    for query_filter, label in [(None, "unfiltered"), (FILTER, "filtered")]:
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            store.client_search(query_filter, query.tolist())
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        print(
+            f"{name} {size}: {label} search {latencies[len(latencies) // 2]:.2f} ms p50 "
+            f"{latencies[int(len(latencies) * 0.95)]:.2f} ms p95"
+        )
+    # worst case of the chat: only the last of three tiers answers
+    for batch, label in [(False, "sequential"), (True, "batched")]:
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search_tiers([NO_MATCH, NO_MATCH, FILTER], query.tolist(), batch)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        print(
+            f"{name} {size}: {label} cascade {latencies[len(latencies) // 2]:.2f} ms p50 "
+            f"{latencies[int(len(latencies) * 0.95)]:.2f} ms p95"
+        )
+
+
+def qdrant_client():
+    try:
+        requests.get("http://localhost:6333").raise_for_status()
+    except requests.RequestException:
+        return None
+    return QdrantClient(host="localhost", port=6333)
+
+
+def main():
+    client = qdrant_client()
+    if client is None:
+        print("Qdrant is not running, only the local store is measured")
+    for size in SIZES:
+        size_points = points(size)
+        with tempfile.TemporaryDirectory() as directory:
+            db = Database(os.path.join(directory, "game-library.db"))
+
+            store = LocalVectorStore(db)
+            store.create_collection()
+            start = time.perf_counter()
+            for i in range(0, size, Qdrant.batch_size):
+                store.upsert_points(size_points[i : i + Qdrant.batch_size])
+            store.save()
+            print(f"local {size}: stored in {time.perf_counter() - start:.2f}s")
+            start = time.perf_counter()
+            store = LocalVectorStore(db)
+            store.client_search(FILTER, size_points[0].vector)
+            print(f"local {size}: loaded in {time.perf_counter() - start:.2f}s")
+            measure("local", store, size)
+
+            if client is not None:
+                store = Qdrant(client, db)
+                store.collection_name = store.write_name = "benchmark_games"
+                client.recreate_collection(
+                    store.collection_name,
+                    vectors_config=models.VectorParams(
+                        size=DIMENSION, distance=models.Distance.COSINE
+                    ),
+                )
+                start = time.perf_counter()
+                for i in range(0, size, Qdrant.batch_size):
+                    store.upsert_points(size_points[i : i + Qdrant.batch_size])
+                print(f"qdrant {size}: stored in {time.perf_counter() - start:.2f}s")
+                measure("qdrant", store, size)
+                client.delete_collection(store.collection_name)
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -32,10 +32,28 @@ def parse_args():
         action="store_true",
         help="Refresh data of already known BGG pages.",
     )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        choices=["api", "selenium"],
+        default="api",
+        help="Fetch the BGG data from the XML API or by rendering the pages with selenium.",
+    )
+    parser.add_argument(
+        "-o",
+        "--offline",
+        action="store_true",
+        help="Rebuild the database only from the cached BGG pages without network access.",
+    )
+    parser.add_argument(
+        "--hydrate-classifications",
+        action="store_true",
+        help="Only fetch the missing descriptions of types, categories and mechanisms.",
+    )
     parser.add_argument(
         "mode",
-        choices=["db", "chat"],
-        help="Mode to perform. db refreshes the database, chat starts the chatbot.",
+        choices=["db", "chat", "serve"],
+        help="Mode to perform. db refreshes the database, chat starts the chatbot, serve keeps the chatbot loaded for chat.",
     )
     return parser.parse_args()
 
@@ -48,6 +66,9 @@ def main():
         "refresh": args.refresh,
         "mode": args.mode,
         "expansions": args.expansions,
+        "backend": args.backend,
+        "offline": args.offline,
+        "hydrate": args.hydrate_classifications,
     }
     run(config)
 
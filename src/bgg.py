@@ -1,39 +1,279 @@
-import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Union
+import multiprocessing
+import os
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from bs4 import BeautifulSoup
 
-from .db import Database
-from .models import Category, Game, Mechanism, Type
-from .selenium import Selenium
+from .bgg_api import BGGApi, BGGApiError, BGGUserError, parse_things
+from .cache import PageCache
+from .counter import StageCounter
+from .models import Category, Classification, Game, Mechanism, Type
+from .parser import parse_detail_page
+from .registry import ClassificationRegistry
+
+ParseJob = Tuple[Callable[..., List[Dict]], Tuple]
+PARSE_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
 
 
 class BGG:
     bgg_domain = "https://boardgamegeek.com"
+    fetch_workers = int(os.environ.get("BGG_FETCH_WORKERS", 0)) or None
+    parse_workers = int(os.environ.get("BGG_PARSE_WORKERS", 0)) or os.cpu_count()
+    hydrate_workers = int(os.environ.get("BGG_HYDRATE_WORKERS", 2))
 
-    def __init__(self, bgg_username: str, verbose: bool = False):
+    def __init__(
+        self,
+        bgg_username: str,
+        backend: str = "api",
+        offline: bool = False,
+        verbose: bool = False,
+        refresh: bool = False,
+    ):
         self.bgg_username = bgg_username
         self.games = []
+        self.on_game = self.games.append
+        self.counters = [
+            StageCounter("fetched"),
+            StageCounter("parsed"),
+            StageCounter("fallback"),
+        ]
         self.verbose = verbose
         self.game_db_ids = []
+        # every game of the BGG collection, also the known ones
+        self.collection_ids: List[int] = []
+        self.classifications = ClassificationRegistry(self._new_classification, verbose)
+        self.cache = PageCache(offline, verbose, refresh)
+        self._selenium = None
+        self.selenium_lock = threading.Lock()
+        self.api = (
+            BGGApi(self.bgg_domain, self.cache, verbose) if backend == "api" else None
+        )
+
+    @property
+    def selenium(self):
+        # selenium is only imported when a page has to be rendered
+        with self.selenium_lock:
+            if self._selenium is None:
+                from .selenium import SeleniumPool
+
+                self._selenium = SeleniumPool(verbose=self.verbose)
+            return self._selenium
 
     def set_db_bgg_ids(self, game_ids: List[int]) -> None:
-        self.game_db_ids = game_ids
+        self.game_db_ids = set(game_ids)
+
+    def set_game_sink(self, on_game: Callable[[Game], None]) -> None:
+        self.on_game = on_game
+
+    def set_db_classifications(self, classifications: List[Dict]) -> None:
+        self.classifications.load(classifications)
 
     def check(self, soup: BeautifulSoup) -> Union[Exception, None]:
         error = soup.find("div", class_="messagebox error")
         if error and error.text.strip() == "No username specified.":
-            raise Exception("Wrong BGG username")
+            raise BGGUserError("Wrong BGG username")
 
     def get_data_from_collection(self) -> None:
+        try:
+            if self.api:
+                try:
+                    self._get_data_from_api()
+                    return
+                except BGGApiError as e:
+                    print(f"BGG XML API not available, falling back to selenium: {e}")
+            self._get_data_from_collection_page()
+        finally:
+            self.close()
+            if self.verbose:
+                self.classifications.report()
+
+    def hydrate_classifications(
+        self, classifications: List[Classification]
+    ) -> List[Classification]:
+        try:
+            with ThreadPoolExecutor(max_workers=self.hydrate_workers) as executor:
+                hydrated = executor.map(self._fetch_description, classifications)
+                return [classification for classification in hydrated if classification]
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._selenium is not None:
+            self._selenium.close()
+        if self.api:
+            self.api.close()
+        self.cache.prune()
+
+    def _get_rendered_html(
+        self, url: str, wait_for: str = None, revalidate: bool = False
+    ) -> str:
+        entry = self.cache.get_fresh(url, revalidate)
+        if entry:
+            return entry.content
+        if self.cache.offline:
+            print(f"URL {url} is not cached")
+            return ""
+
+        rendered_html = self.selenium.get_html_content(url, wait_for)
+        if rendered_html:
+            self.cache.put(url, rendered_html)
+        return rendered_html
+
+    def _get_html(self, url: str) -> str:
+        if self.api:
+            try:
+                return self.api.get(url)
+            except BGGApiError as e:
+                print(e)
+                return ""
+        return self._get_rendered_html(url)
+
+    def _unknown_games(
+        self, game_urls: List[Tuple[int, str, str]]
+    ) -> List[Tuple[int, str, str]]:
+        unknown_games = []
+        for bgg_id, title, bgg_url in game_urls:
+            if bgg_id in self.game_db_ids:
+                if self.verbose:
+                    print(f"Skip known game: {title}")
+                continue
+            unknown_games.append((bgg_id, title, bgg_url))
+        return unknown_games
+
+    def _run_pipeline(
+        self,
+        fetch: Callable[..., List[ParseJob]],
+        jobs: List[Tuple],
+        fetch_workers: int,
+        fallback: Optional[Callable[..., List[ParseJob]]] = None,
+    ) -> None:
+        fetched, parsed, _ = self.counters
+        fetched.start()
+        parsed.start()
+        fetch_workers = self.fetch_workers or fetch_workers
+        # only a few jobs are fetched ahead so a slow consumer slows down fetching
+        max_in_flight = 2 * (fetch_workers + self.parse_workers)
+        jobs = iter(jobs)
+
+        # io bound fetching runs in threads, cpu bound parsing in processes
+        with ThreadPoolExecutor(
+            max_workers=fetch_workers
+        ) as fetch_executor, ProcessPoolExecutor(
+            max_workers=self.parse_workers,
+            # a forked child could inherit a lock held by the writer, embed or
+            # fetch threads
+            mp_context=multiprocessing.get_context(PARSE_START_METHOD),
+        ) as parse_executor:
+            # every future keeps the job it came from, for the fallback
+            pending = {}
+            in_flight = 0
+            while True:
+                while in_flight < max_in_flight:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    pending[fetch_executor.submit(fetch, *job)] = ("fetch", job)
+                    in_flight += 1
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, job = pending.pop(future)
+                    if stage in ("fetch", "fallback"):
+                        fetched.add()
+                        in_flight -= 1
+                        # the jobs of a fallback have no further fallback
+                        job = job if stage == "fetch" else None
+                        for parse, args in future.result():
+                            pending[parse_executor.submit(parse, *args)] = (
+                                "parse",
+                                job,
+                            )
+                            in_flight += 1
+                    elif stage == "parse":
+                        in_flight -= 1
+                        try:
+                            records = future.result()
+                        except BGGApiError as e:
+                            if fallback is None or job is None:
+                                raise
+                            print(f"{e}, falling back to selenium")
+                            pending[fetch_executor.submit(fallback, *job)] = (
+                                "fallback",
+                                job,
+                            )
+                            in_flight += 1
+                            continue
+                        for record in records:
+                            parsed.add()
+                            pending[fetch_executor.submit(self._add_game, record)] = (
+                                "game",
+                                None,
+                            )
+                    else:
+                        future.result()
+
+    def _get_data_from_api(self) -> None:
+        game_urls = self.api.get_collection(self.bgg_username)
+        self.collection_ids = [bgg_id for bgg_id, _, _ in game_urls]
+        game_urls = self._unknown_games(game_urls)
+        batches = [
+            (game_urls[i : i + self.api.batch_size],)
+            for i in range(0, len(game_urls), self.api.batch_size)
+        ]
+        self._run_pipeline(
+            self._fetch_api_batch,
+            batches,
+            self.api.pool_size,
+            fallback=self._fetch_detail_pages,
+        )
+
+    def _fetch_api_batch(self, game_urls: List[Tuple[int, str, str]]) -> List[ParseJob]:
+        if self.verbose:
+            print(f"Getting data of {len(game_urls)} games from the BGG XML API")
+        try:
+            content = self.api.get_things([bgg_id for bgg_id, _, _ in game_urls])
+        except BGGApiError as e:
+            print(f"{e}, falling back to selenium")
+            return self._fetch_detail_pages(game_urls)
+
+        titles = {bgg_id: title for bgg_id, title, _ in game_urls}
+        return [(parse_things, (content, self.bgg_domain, titles))]
+
+    def _fetch_detail_pages(
+        self, game_urls: List[Tuple[int, str, str]]
+    ) -> List[ParseJob]:
+        _, _, fallback = self.counters
+        fallback.add(len(game_urls))
+        return [
+            parse_job
+            for bgg_id, title, bgg_url in game_urls
+            for parse_job in self._fetch_detail_page(bgg_id, title, bgg_url)
+        ]
+
+    def _get_data_from_collection_page(self) -> None:
         bgg_collection_url = f"https://boardgamegeek.com/collection/user/{self.bgg_username}?own=1&subtype=boardgame&ff=1"
-        rendered_html = Selenium(bgg_collection_url).get_html_content()
+        rendered_html = self._get_rendered_html(
+            bgg_collection_url, wait_for="table#collectionitems", revalidate=True
+        )
         soup = BeautifulSoup(rendered_html, "html.parser")
 
         self.check(soup)
 
         table = soup.find("table", {"id": "collectionitems"})
+        if not table:
+            raise Exception(f"No collection found for BGG username {self.bgg_username}")
         game_urls = [
             (
                 int(a_tag["href"].split("/")[2]),
@@ -43,148 +283,78 @@ class BGG:
             for tr in table.find_all("tr", id=lambda x: x and x.startswith("row_"))
             if (a_tag := tr.find("a", class_="primary"))
         ]
+        self.collection_ids = [bgg_id for bgg_id, _, _ in game_urls]
 
-        with ThreadPoolExecutor() as executor:
-            futures = [
-                executor.submit(self._get_data_from_detail_page, bgg_id, name, bgg_url)
-                for bgg_id, name, bgg_url in game_urls
-            ]
-            for future in as_completed(futures):
-                future.result()
-
-    def _extract_links_for_category(
-        self, items: BeautifulSoup, category_name: str
-    ) -> Union[List[Type], List[Category], List[Mechanism]]:
-        classifications = []
-        class_map = {"type": Type, "category": Category, "mechanism": Mechanism}
-        for link in items.find_all("a", href=True):
-            bgg_id = link["href"].split("/")[2]
-            classification = Database().get_classification_by_id(
-                bgg_id, category_name.lower()
-            )
-            classification_class = class_map.get(category_name.lower())
-            if classification:
-                classifications.append(
-                    classification_class(
-                        classification["bgg_id"],
-                        classification["name"],
-                        classification["bgg_url"],
-                        classification["description"],
-                    )
-                )
-                if self.verbose:
-                    print(f"Skip known {category_name}: {classification['name']}")
-                continue
-
-            bgg_url = f"{self.bgg_domain}{link['href']}"
-            rendered_html = Selenium(bgg_url).get_html_content()
-            if rendered_html:
-                soup = BeautifulSoup(rendered_html, "html.parser")
-
-                name = link.text.strip()
-                description = soup.find("meta", attrs={"name": "description"})
-                if classification_class:
-                    classifications.append(
-                        classification_class(
-                            bgg_id,
-                            re.sub(
-                                r"[:,]", "/", name
-                            ),  # replace ":" and "," due to needs of Database.get_games()
-                            bgg_url,
-                            description=description.get("content"),
-                        )
-                    )
-                    if self.verbose:
-                        print(f"New {category_name}: {name}")
-        return classifications
-
-    def _get_data_from_detail_page(self, bgg_id: int, title: str, bgg_url: str) -> None:
-        if bgg_id in self.game_db_ids:
-            if self.verbose:
-                print(f"Skip known game: {title}")
-            return
+        self._run_pipeline(
+            self._fetch_detail_page, self._unknown_games(game_urls), self.selenium.size
+        )
 
+    def _fetch_detail_page(
+        self, bgg_id: int, title: str, bgg_url: str
+    ) -> List[ParseJob]:
         if self.verbose:
             print(f"Getting data from {bgg_url}")
-        rendered_html = Selenium(bgg_url).get_html_content()
-        soup = BeautifulSoup(rendered_html, "html.parser")
-
-        game = Game(bgg_id=bgg_id, bgg_url=bgg_url, title=title)
-
-        expansion = soup.find("div", class_="game-header-subtype ng-scope")
-        game.expansion = bool(expansion and "Expansion" in expansion.get_text())
-
-        description = soup.find("article", class_="game-description-body")
-        if description:
-            game.description = description.get_text(separator="\n").strip()
-
-        year = soup.find("span", class_="game-year")
-        if year:
-            match = re.search(r"\d{4}", year.text)
-            if match:
-                game.year = match.group(0)
-
-        bgg_rating = soup.find("span", itemprop="ratingValue")
-        if bgg_rating:
-            game.bgg_rating = bgg_rating.text.strip()
-
-        complexity = soup.find("span", {"class": re.compile("gameplay-weight-.*")})
-        if complexity:
-            game.complexity = complexity.text.strip()
-
-        players = soup.find("li", itemprop="numberOfPlayers")
-        if players:
-            min_players = players.find("meta", itemprop="minValue")
-            max_players = players.find("meta", itemprop="maxValue")
-            game.min_players = min_players["content"] if min_players else None
-            game.max_players = max_players["content"] if max_players else None
-
-        game.min_playtime = 0
-        game.max_playtime = 0
-        gameplay_items = soup.find_all("li", class_="gameplay-item")
-        for gameplay_item in gameplay_items:
-            play_time = gameplay_item.find("h3", string="Play Time")
-            if play_time:
-                min_playtime = gameplay_item.find(
-                    "span",
-                    class_="ng-binding ng-scope",
-                )
-                if min_playtime:
-                    game.min_playtime = min_playtime.get_text(strip=True)
-                    max_playtime = min_playtime.find_next_sibling()
-                    if max_playtime:
-                        game.max_playtime = (
-                            max_playtime.get_text(strip=True).split("–")[-1].strip()
-                        )
-                    else:
-                        game.max_playtime = game.min_playtime
-                break
-
-        image = soup.find("img", itemprop="image")
-        if image:
-            game.image_url = image["src"]
+        rendered_html = self._get_rendered_html(bgg_url, wait_for="li.gameplay-item")
+        # new request due to details like "+ 5 more"
+        credits_html = self._get_rendered_html(
+            f"{bgg_url}/credits", wait_for="li.outline-item"
+        )
+        return [
+            (
+                parse_detail_page,
+                (bgg_id, title, bgg_url, rendered_html, credits_html, self.bgg_domain),
+            )
+        ]
 
-        game_classification = soup.find("div", class_="game-classification")
-        if game_classification:
-            category = game_classification.find("h4", text=re.compile("Type"))
-            if category:
-                feature_item = category.find_parent("li")
-                if feature_item:
-                    game.types = self._extract_links_for_category(feature_item, "Type")
+    def _add_game(self, record: Dict) -> None:
+        game = Game(
+            **{
+                key: value
+                for key, value in record.items()
+                if key not in ("types", "categories", "mechanisms")
+            },
+            types=self._resolve_classifications(
+                [Type(*link) for link in record["types"]], "Type"
+            ),
+            categories=self._resolve_classifications(
+                [Category(*link) for link in record["categories"]], "Category"
+            ),
+            mechanisms=self._resolve_classifications(
+                [Mechanism(*link) for link in record["mechanisms"]], "Mechanism"
+            ),
+        )
+        self.on_game(game)
 
-        # new request due to details like "+ 5 more"
-        bgg_url = f"{bgg_url}/credits"
-        rendered_html = Selenium(bgg_url).get_html_content()
-        soup = BeautifulSoup(rendered_html, "html.parser")
+    def _resolve_classifications(
+        self,
+        classifications: Union[List[Type], List[Category], List[Mechanism]],
+        category_name: str,
+    ) -> Union[List[Type], List[Category], List[Mechanism]]:
+        resolved = [
+            self.classifications.resolve(classification, category_name)
+            for classification in classifications
+        ]
+        return [classification for classification in resolved if classification]
 
-        game_classification = soup.find_all("li", class_="outline-item ng-scope")
-        for element in game_classification:
-            title_element = element.find("span", id="fullcredits-boardgamecategory")
-            if title_element:
-                game.categories = self._extract_links_for_category(element, "Category")
+    def _new_classification(
+        self, classification: Classification, category_name: str
+    ) -> Classification:
+        # the description is added later by hydrate_classifications
+        if self.verbose:
+            print(f"New {category_name}: {classification.name}")
+        return classification
 
-            title_element = element.find("span", id="fullcredits-boardgamemechanic")
-            if title_element:
-                game.mechanisms = self._extract_links_for_category(element, "Mechanism")
+    def _fetch_description(
+        self, classification: Classification
+    ) -> Optional[Classification]:
+        rendered_html = self._get_html(classification.bgg_url)
+        if not rendered_html:
+            return None
 
-        self.games.append(game)
+        soup = BeautifulSoup(rendered_html, "html.parser")
+        description = soup.find("meta", attrs={"name": "description"})
+        if not description:
+            return None
+        if self.verbose:
+            print(f"Hydrated {classification.get_type()}: {classification.name}")
+        return replace(classification, description=description.get("content"))
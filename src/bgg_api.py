@@ -0,0 +1,266 @@
+import html
+import os
+import time
+import xml.etree.ElementTree as ElementTree
+from typing import Dict, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cache import PageCache
+
+
+# the type names of the game page by subdomain id, the API names them
+# "Strategy Game Rank" or "Strategy Games"
+TYPE_NAMES = {
+    4666: "Abstract",
+    4665: "Children's",
+    4667: "Customizable",
+    5499: "Family",
+    5498: "Party",
+    5497: "Strategy",
+    5496: "Thematic",
+    4664: "Wargames",
+}
+FAMILY_RANKS = {
+    "abstracts": 4666,
+    "childrensgames": 4665,
+    "cgs": 4667,
+    "familygames": 5499,
+    "partygames": 5498,
+    "strategygames": 5497,
+    "thematic": 5496,
+    "wargames": 4664,
+}
+
+
+class BGGApiError(Exception):
+    pass
+
+
+class BGGUserError(Exception):
+    # not an outage of the API, the selenium fallback would fail the same way
+    pass
+
+
+class BGGApi:
+    api_url = os.environ.get("BGG_API_URL", "https://boardgamegeek.com/xmlapi2")
+    api_token = os.environ.get("BGG_API_TOKEN")
+    batch_size = int(os.environ.get("BGG_API_BATCH_SIZE", 20))
+    pool_size = int(os.environ.get("BGG_API_POOL_SIZE", 4))
+    # BGG answers 202 while a collection request is queued
+    queued_retries = 10
+    queued_delay = 2
+
+    def __init__(self, bgg_domain: str, cache: PageCache = None, verbose: bool = False):
+        self.bgg_domain = bgg_domain
+        self.cache = cache
+        self.verbose = verbose
+        self.session = requests.Session()
+        retry = Retry(
+            total=5,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if self.api_token:
+            self.session.headers["Authorization"] = f"Bearer {self.api_token}"
+
+    def close(self):
+        self.session.close()
+
+    def get(self, url: str, params: Dict = None, revalidate: bool = False) -> str:
+        url = requests.Request("GET", url, params=params).prepare().url
+        if not self.cache:
+            return self._get(url).text
+
+        entry = self.cache.get_fresh(url, revalidate)
+        if entry:
+            return entry.content
+        if self.cache.offline:
+            raise BGGApiError(f"URL {url} is not cached")
+
+        entry = self.cache.get(url)
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        response = self._get(url, headers)
+        if response.status_code == 304 and entry:
+            if self.verbose:
+                print(f"Cached page not modified {url}")
+            return self.cache.revalidated(entry).content
+        self.cache.put(
+            url,
+            response.text,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+        return response.text
+
+    def _get(self, url: str, headers: Dict = None) -> requests.Response:
+        for _ in range(self.queued_retries):
+            try:
+                response = self.session.get(url, headers=headers, timeout=30)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                raise BGGApiError(f"Error fetching URL {url}: {e}")
+            if response.status_code != 202:
+                return response
+            if self.verbose:
+                print(f"Request queued by BGG, retry {url}")
+            time.sleep(self.queued_delay)
+        raise BGGApiError(f"Request still queued by BGG: {url}")
+
+    def get_collection(self, bgg_username: str) -> List[Tuple[int, str, str]]:
+        content = self.get(
+            f"{self.api_url}/collection",
+            params={"username": bgg_username, "own": 1, "subtype": "boardgame"},
+            # games added on BGG have to show up in the next run
+            revalidate=True,
+        )
+        try:
+            return parse_collection(content, self.bgg_domain)
+        except ElementTree.ParseError as e:
+            raise BGGApiError(f"Invalid collection response: {e}")
+
+    def get_things(self, bgg_ids: List[int]) -> str:
+        return self.get(
+            f"{self.api_url}/thing",
+            params={"id": ",".join(str(bgg_id) for bgg_id in bgg_ids), "stats": 1},
+        )
+
+
+def parse_collection(content: str, bgg_domain: str) -> List[Tuple[int, str, str]]:
+    root = ElementTree.fromstring(content)
+    error = root.find("error/message")
+    if error is not None:
+        if "username" in error.text.lower():
+            raise BGGUserError(f"Wrong BGG username: {error.text}")
+        raise BGGApiError(error.text)
+
+    game_urls = []
+    for item in root.iter("item"):
+        bgg_id = int(item.get("objectid"))
+        name = item.find("name")
+        game_urls.append(
+            (
+                bgg_id,
+                name.text if name is not None else "",
+                f"{bgg_domain}/boardgame/{bgg_id}",
+            )
+        )
+    return game_urls
+
+
+def _value(item: ElementTree.Element, path: str) -> str:
+    element = item.find(path)
+    if element is None:
+        return None
+    value = element.get("value")
+    return value if value not in (None, "", "0", "0.0") else None
+
+
+def parse_things(
+    content: str, bgg_domain: str, titles: Dict[int, str] = None
+) -> List[Dict]:
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError as e:
+        raise BGGApiError(f"Invalid thing response: {e}")
+    link_map = {"boardgamecategory": "categories", "boardgamemechanic": "mechanisms"}
+    titles = titles or {}
+
+    records = []
+    for item in root.iter("item"):
+        bgg_id = int(item.get("id"))
+        title = item.find("name[@type='primary']")
+        record = {
+            "bgg_id": bgg_id,
+            # keep the title as it is shown in the collection
+            "title": titles.get(bgg_id)
+            or (title.get("value") if title is not None else ""),
+            "bgg_url": f"{bgg_domain}/boardgame/{bgg_id}",
+            "expansion": item.get("type") == "boardgameexpansion",
+            "description": None,
+            "year": _value(item, "yearpublished"),
+            "bgg_rating": None,
+            "complexity": None,
+            "image_url": None,
+            "min_players": _value(item, "minplayers"),
+            "max_players": _value(item, "maxplayers"),
+            "min_playtime": _value(item, "minplaytime") or 0,
+            "max_playtime": None,
+            "types": [],
+            "categories": [],
+            "mechanisms": [],
+        }
+        record["max_playtime"] = _value(item, "maxplaytime") or record["min_playtime"]
+
+        description = item.findtext("description")
+        if description:
+            record["description"] = html.unescape(description).strip()
+
+        bgg_rating = _value(item, "statistics/ratings/average")
+        if bgg_rating:
+            record["bgg_rating"] = f"{float(bgg_rating):.1f}"
+
+        complexity = _value(item, "statistics/ratings/averageweight")
+        if complexity:
+            record["complexity"] = f"{float(complexity):.2f}"
+
+        image = item.findtext("image")
+        if image:
+            record["image_url"] = image.strip()
+
+        # the types shown on the game page are the subdomains of the game,
+        # unranked games only have the links
+        rank_types, link_types = [], []
+        for rank in item.iterfind("statistics/ratings/ranks/rank[@type='family']"):
+            type_id = FAMILY_RANKS.get(rank.get("name"), int(rank.get("id")))
+            rank_types.append(
+                (
+                    type_id,
+                    TYPE_NAMES.get(
+                        type_id, rank.get("friendlyname").removesuffix(" Rank")
+                    ),
+                    f"{bgg_domain}/boardgamesubdomain/{type_id}",
+                )
+            )
+
+        for link in item.iterfind("link"):
+            if link.get("type") == "boardgamesubdomain":
+                type_id = int(link.get("id"))
+                link_types.append(
+                    (
+                        type_id,
+                        TYPE_NAMES.get(
+                            type_id, link.get("value").removesuffix(" Games")
+                        ),
+                        f"{bgg_domain}/boardgamesubdomain/{type_id}",
+                    )
+                )
+                continue
+            key = link_map.get(link.get("type"))
+            if key:
+                record[key].append(
+                    (
+                        int(link.get("id")),
+                        link.get("value"),
+                        f"{bgg_domain}/{link.get('type')}/{link.get('id')}",
+                    )
+                )
+        record["types"] = link_types or rank_types
+
+        records.append(record)
+    return records
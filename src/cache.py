@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import List, Optional
+
+PAGE_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "page_cache",
+)
+
+
+class CacheEntry:
+    def __init__(
+        self,
+        url: str,
+        content: str,
+        fetched_at: float,
+        etag: str = None,
+        last_modified: str = None,
+    ):
+        self.url = url
+        self.content = content
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self, ttl: int) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "content": self.content,
+            "fetched_at": self.fetched_at,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+        }
+
+
+class PageCache:
+    cache_dir = os.environ.get("PAGE_CACHE_DIR", PAGE_CACHE_DIR)
+    ttl = int(os.environ.get("PAGE_CACHE_TTL", 7 * 24 * 60 * 60))
+    max_size = int(os.environ.get("PAGE_CACHE_MAX_SIZE", 512 * 1024 * 1024))
+
+    def __init__(
+        self, offline: bool = False, verbose: bool = False, refresh: bool = False
+    ):
+        self.offline = offline
+        self.verbose = verbose
+        # every cached page is revalidated, whatever its age
+        self.refresh = refresh
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        path = self._path(url)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as cache_file:
+                entry = CacheEntry(**json.load(cache_file))
+        except (OSError, ValueError, TypeError):
+            return None
+        # the modification time is used as last access for the lru eviction
+        os.utime(path)
+        return entry
+
+    def get_fresh(self, url: str, revalidate: bool = False) -> Optional[CacheEntry]:
+        entry = self.get(url)
+        if not entry:
+            return None
+        if self.offline or (
+            not revalidate and not self.refresh and entry.is_fresh(self.ttl)
+        ):
+            if self.verbose:
+                print(f"Use cached page {url}")
+            return entry
+        return None
+
+    def put(
+        self, url: str, content: str, etag: str = None, last_modified: str = None
+    ) -> CacheEntry:
+        entry = CacheEntry(url, content, time.time(), etag, last_modified)
+        self._write(entry)
+        return entry
+
+    def revalidated(self, entry: CacheEntry) -> CacheEntry:
+        entry.fetched_at = time.time()
+        self._write(entry)
+        return entry
+
+    def _write(self, entry: CacheEntry):
+        path = self._path(entry.url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as cache_file:
+            json.dump(entry.to_dict(), cache_file)
+        os.replace(tmp_path, path)
+
+    def _files(self) -> List[os.DirEntry]:
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [
+            file
+            for directory in os.scandir(self.cache_dir)
+            if directory.is_dir()
+            for file in os.scandir(directory.path)
+            if file.name.endswith(".json.gz")
+        ]
+
+    def urls(self) -> List[str]:
+        urls = []
+        for file in self._files():
+            try:
+                with gzip.open(file.path, "rt", encoding="utf-8") as cache_file:
+                    urls.append(json.load(cache_file)["url"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return urls
+
+    def prune(self):
+        files = sorted(self._files(), key=lambda file: file.stat().st_mtime)
+        size = sum(file.stat().st_size for file in files)
+        removed = 0
+        while files and size > self.max_size:
+            file = files.pop(0)
+            size -= file.stat().st_size
+            os.remove(file.path)
+            removed += 1
+        if self.verbose and removed:
+            print(f"Removed {removed} least recently used pages from the cache")
@@ -1,14 +1,16 @@
 import json
 import os
-import sys
-from typing import Literal, Union
+import threading
+from typing import Dict, List, Literal, Union
 
 import requests
 from openai import OpenAI
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
+from qdrant_client import models
 
+from .daemon import repl
 from .db import Database
+from .encoder import get_encoder
+from .models import Game
 from .qdrant import Qdrant
 
 NO_GAME_FOUND_MSG = "No suitable game models were found based on your request."
@@ -66,12 +68,11 @@ class Chat:
 
 
 class PrepareChat(Chat):
-    def __init__(
-        self, qdrant: Qdrant, model: SentenceTransformer, verbose: bool = False
-    ):
+    search_mode = os.environ.get("SEARCH_CASCADE_MODE", "batch")
+
+    def __init__(self, qdrant: Qdrant, verbose: bool = False):
         super().__init__(verbose)
         self.qdrant = qdrant
-        self.model = model
         self.json_content = {}
         self.filter_players_playtime = []
         self.filter_complexity = []
@@ -131,7 +132,7 @@ class PrepareChat(Chat):
                     [
                         models.FieldCondition(
                             key="complexity",
-                            range=models.Range(lte=min_complexity, gte=max_complexity),
+                            range=models.Range(gte=min_complexity, lte=max_complexity),
                         ),
                         models.IsEmptyCondition(
                             is_empty=models.PayloadField(key="complexity"),
@@ -141,7 +142,7 @@ class PrepareChat(Chat):
             elif key == "genre":
                 self.filter_categories.append(
                     models.FieldCondition(
-                        key="type",
+                        key="types",
                         match=models.MatchAny(any=value),
                     )
                 )
@@ -153,104 +154,60 @@ class PrepareChat(Chat):
                 )
                 self.filter_categories.append(
                     models.FieldCondition(
-                        key="mechanism",
+                        key="mechanisms",
                         match=models.MatchAny(any=value),
                     )
                 )
 
-    def search_result(self):
-        if "genre" in self.json_content:
-            query_vector = self.model.encode(
-                ", ".join(self.json_content["genre"])
-            ).tolist()
-
-            search_result = self.qdrant.client_search(
-                query_filter=models.Filter(
-                    must=[
-                        models.Filter(
-                            must=self.filter_players_playtime,
-                        ),
-                        models.Filter(
-                            should=self.filter_complexity,
-                        ),
-                        models.Filter(
-                            should=self.filter_categories,
-                        ),
-                    ],
-                ),
-                query_vector=query_vector,
-            )
-            if not search_result:
-                search_result = self.qdrant.client_search(
-                    query_filter=models.Filter(
+    def search_filters(self) -> List[models.Filter]:
+        # from all filters to only players and playtime
+        return [
+            models.Filter(
+                must=[
+                    models.Filter(
                         must=self.filter_players_playtime,
-                        should=[
-                            models.Filter(should=self.filter_complexity),
-                            models.Filter(should=self.filter_categories),
-                        ],
                     ),
-                    query_vector=query_vector,
-                )
-
-                if not search_result:
-                    search_result = self.qdrant.client_search(
-                        query_filter=models.Filter(must=self.filter_players_playtime),
-                        query_vector=query_vector,
-                    )
+                    models.Filter(
+                        should=self.filter_complexity,
+                    ),
+                    models.Filter(
+                        should=self.filter_categories,
+                    ),
+                ],
+            ),
+            models.Filter(
+                must=self.filter_players_playtime,
+                should=[
+                    models.Filter(should=self.filter_complexity),
+                    models.Filter(should=self.filter_categories),
+                ],
+            ),
+            models.Filter(must=self.filter_players_playtime),
+        ]
 
-        else:
-            search_result = self.qdrant.client_scroll(
-                scroll_filter=models.Filter(
-                    must=[
-                        models.Filter(
-                            must=self.filter_players_playtime,
-                        ),
-                        models.Filter(
-                            should=self.filter_complexity,
-                        ),
-                        models.Filter(
-                            should=self.filter_categories,
-                        ),
-                    ],
-                ),
+    def search_result(self):
+        query_vector = None
+        if "genre" in self.json_content:
+            query_vector = (
+                get_encoder().encode(", ".join(self.json_content["genre"])).tolist()
             )
-            if not search_result:
-                search_result = self.qdrant.client_scroll(
-                    query_filter=models.Filter(
-                        must=self.filter_players_playtime,
-                        should=[
-                            models.Filter(should=self.filter_complexity),
-                            models.Filter(should=self.filter_categories),
-                        ],
-                    ),
-                )
 
-                if not search_result:
-                    search_result = self.qdrant.client_scroll(
-                        query_filter=models.Filter(must=self.filter_players_playtime),
-                    )
-            search_result = search_result[0]
+        # all tiers are sent in one request instead of one request per tier
+        search_result, tier = self.qdrant.search_tiers(
+            self.search_filters(), query_vector, self.search_mode == "batch"
+        )
 
         if self.verbose:
+            filters = len(self.search_filters())
+            if tier is None:
+                print(f"No search tier of {filters} answered")
+            else:
+                print(f"Search tier {tier + 1} of {filters} answered")
             print(search_result)
         return search_result
 
 
-def run(
-    db: Database,
-    client: QdrantClient,
-    model: SentenceTransformer,
-    with_expansions: bool = False,
-    fast: bool = False,
-    verbose: bool = False,
-):
-    all_games_dict = {game.bgg_id: game for game in db.get_games(with_expansions)}
-
-    qdrant = Qdrant(client, db, model, verbose)
-    prepare_chat = PrepareChat(qdrant, model, verbose)
-    prepare_chat.check()
-
-    prepare_prompt = """Your sole responsibility is to analyze the user's prompt and extract relevant information to enhance board game search capabilities. Respond exclusively with a JSON object following the schema below, filling in the values based on the user's statement. Do not include any additional text or explanations. If no relevant data is available, remove the key from the json. At the end no None values should be present in the JSON object and the json object must be valid and loadable in the python function json.loads().
+PREPARE_PROMPT = """Your sole responsibility is to analyze the user's prompt and extract relevant information to enhance board game search capabilities. Respond exclusively with a JSON object following the schema below, filling in the values based on the user's statement. Do not include any additional text or explanations. If no relevant data is available, remove the key from the json. At the end no None values should be present in the JSON object and the json object must be valid and loadable in the python function json.loads().
 
     The values for players, playtime, and complexity must be provided as integers only if explicitly mentioned by the user. The playtime must be converted to minutes. The complexity should range from 0 to 5, based on the weight value from boardgamegeeks.com. The language of the user's request must be included in the 'language' key and should be written as an English word. The genre must be a list of values provided in English, and the description should be a flowing text provided in English, regardless of the user's language.
 
@@ -266,47 +223,85 @@ def run(
     }
     """
 
-    prepare_chat.append_chat_history("system", prepare_prompt)
 
-    print("What are you looking for today?")
-    user_input = input()
-
-    if prepare_chat.use_openai:
-        print("Please wait 10 seconds for your game recommendations")
-    else:
-        print(
-            "Please wait up to 2 minutes for your game recommendations. Depends on the gpu / cpu you have"
-        )
-
-    prepare_chat.append_chat_history("user", user_input)
-    response_content = prepare_chat.execute()
+class Recommender:
+    # keeps the games, the encoder and the vector store loaded between the
+    # questions and reloads them when an ingest changed them
+    def __init__(
+        self,
+        db: Database,
+        qdrant: Qdrant,
+        with_expansions: bool = False,
+        fast: bool = False,
+        verbose: bool = False,
+    ):
+        self.db = db
+        self.qdrant = qdrant
+        self.with_expansions = with_expansions
+        self.fast = fast
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.version = None
+        self.all_games_dict: Dict[int, Game] = {}
+        PrepareChat(qdrant, verbose).check()
+        self.refresh()
+        # the model loads while the user types
+        threading.Thread(target=get_encoder, daemon=True).start()
+
+    def refresh(self):
+        version = (self.qdrant.index_version(), self.db.revision())
+        if version == self.version:
+            return
+        if self.version is None:
+            self.qdrant.check_version()
+        else:
+            if self.verbose:
+                print("Reloading games and index after an ingest")
+            self.qdrant.reload()
+        self.all_games_dict = {
+            game.bgg_id: game for game in self.db.get_games(self.with_expansions)
+        }
+        self.version = version
+
+    def answer(self, user_input: str) -> str:
+        prepare_chat = PrepareChat(self.qdrant, self.verbose)
+        prepare_chat.append_chat_history("system", PREPARE_PROMPT)
+        prepare_chat.append_chat_history("user", user_input)
+        response_content = prepare_chat.execute()
 
-    if verbose:
-        print("Prepare Search: ", response_content)
+        if self.verbose:
+            print("Prepare Search: ", response_content)
 
-    prepare_chat.read_filter(response_content)
+        prepare_chat.read_filter(response_content)
 
-    search_result = prepare_chat.search_result()
+        # the chat models answer in parallel, the index is reloaded in between
+        with self.lock:
+            self.refresh()
+            search_result = prepare_chat.search_result()
+            all_games_dict = self.all_games_dict
 
-    language = prepare_chat.get_language()
+        language = prepare_chat.get_language()
 
-    augmented_prompt = f"""You are a board game recommendation assistant. You recommend the games found below GAME RECOMMANDATIONS. Summarize every single entry of games from the GAME RECOMMANDATIONS below in a maximum of two sentences each. If no game under game recommendations are found, apologize and state that no suitable game is available. Answer in {language}.
+        augmented_prompt = f"""You are a board game recommendation assistant. You recommend the games found below GAME RECOMMANDATIONS. Summarize every single entry of games from the GAME RECOMMANDATIONS below in a maximum of two sentences each. If no game under game recommendations are found, apologize and state that no suitable game is available. Answer in {language}.
 
     === GAME RECOMMANDATIONS
 
     """
 
-    game_models = []
-    for r in search_result:
-        if "score" in r and r.score < 0.4:
-            continue
-        game = all_games_dict.get(r.id)
-        if game:
-            types = ", ".join([game_type.name for game_type in game.types])
-            categories = ", ".join([category.name for category in game.categories])
-            mechanisms = ", ".join([mechanism.name for mechanism in game.mechanisms])
-            game_models.append(
-                f"""
+        game_models = []
+        titles = []
+        for r in search_result:
+            if "score" in r and r.score < 0.4:
+                continue
+            game = all_games_dict.get(r.id)
+            if game:
+                types = ", ".join([game_type.name for game_type in game.types])
+                categories = ", ".join([category.name for category in game.categories])
+                mechanisms = ", ".join(
+                    [mechanism.name for mechanism in game.mechanisms]
+                )
+                game_models.append(
+                    f"""
                 {game.title}
                 ---
                 types: {types}
@@ -323,27 +318,43 @@ def run(
                 max_playtime: {game.max_playtime}
                 ---
                 """
-            )
-            if fast:
-                print(game.title)
+                )
+                titles.append(game.title)
+
+        if not game_models:
+            augmented_prompt += NO_GAME_FOUND_MSG
+            if self.fast:
+                return NO_GAME_FOUND_MSG
+        else:
+            augmented_prompt += "\n\n".join(game_models)
 
-    if not game_models:
-        augmented_prompt += NO_GAME_FOUND_MSG
-        if fast:
-            print(NO_GAME_FOUND_MSG)
-            sys.exit()
-    else:
-        augmented_prompt += "\n\n".join(game_models)
+        if self.verbose:
+            print("Prompt: ", augmented_prompt)
 
-    if verbose:
-        print("Prompt: ", augmented_prompt)
+        if self.fast:
+            return "\n".join(titles)
 
-    if not fast:
         summary_chat = Chat()
         summary_chat.append_chat_history("system", augmented_prompt)
         summary_chat.append_chat_history(
             "user",
             "Briefly summarize the games found",
         )
-        response_content = summary_chat.execute()
-        print(response_content)
+        return summary_chat.execute()
+
+
+def waiting_notice() -> str:
+    if Chat.use_openai:
+        return "Please wait 10 seconds for your game recommendations"
+    return "Please wait up to 2 minutes for your game recommendations. Depends on the gpu / cpu you have"
+
+
+def run(
+    db: Database,
+    qdrant: Qdrant,
+    with_expansions: bool = False,
+    fast: bool = False,
+    verbose: bool = False,
+):
+    recommender = Recommender(db, qdrant, with_expansions, fast, verbose)
+    repl(recommender.answer, waiting_notice())
@@ -0,0 +1,29 @@
+import threading
+import time
+
+
+class StageCounter:
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.started is None:
+                self.started = time.monotonic()
+
+    def add(self, count: int = 1) -> None:
+        with self.lock:
+            now = time.monotonic()
+            if self.started is None:
+                self.started = now
+            self.count += count
+            self.finished = now
+
+    def __str__(self):
+        duration = (self.finished - self.started) if self.started is not None else 0
+        rate = self.count / duration if duration else 0
+        return f"{self.name}: {self.count} in {duration:.1f}s ({rate:.1f}/s)"
@@ -0,0 +1,193 @@
+import json
+import os
+import socket
+import socketserver
+from typing import Callable, Optional
+
+from .db import Database
+
+CHAT_SOCKET = os.environ.get("CHAT_SOCKET", "chat.sock")
+EXIT_COMMANDS = {"exit", "quit"}
+
+
+def repl(answer: Callable[[str], str], notice: str = None):
+    print("What are you looking for today? Type exit to quit.")
+    while True:
+        try:
+            user_input = input("> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return
+        if not user_input:
+            continue
+        if user_input.lower() in EXIT_COMMANDS:
+            return
+        if notice:
+            print(notice)
+        try:
+            print(answer(user_input))
+        except KeyboardInterrupt:
+            # ctrl-c cancels the pending answer, exit ends the session
+            print()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # one failed question does not end the session
+            print(f"An unexpected error occurred: {e}")
+
+
+def _flags(with_expansions: bool, fast: bool) -> str:
+    flags = [flag for flag, used in [("-e", with_expansions), ("-f", fast)] if used]
+    return " ".join(flags) or "no flags"
+
+
+class ChatHandler(socketserver.StreamRequestHandler):
+    # one JSON object per line in both directions
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                options = (request.get("with_expansions"), request.get("fast"))
+                server_options = (self.server.with_expansions, self.server.fast)
+                if options != server_options:
+                    raise ValueError(
+                        f"The chat daemon runs with {_flags(*server_options)}, "
+                        f"not with {_flags(*options)}, restart ./main.py serve "
+                        f"with the same flags or stop it"
+                    )
+                response = {"answer": self.server.answer(request["question"])}
+            except Exception as e:
+                response = {"error": str(e)}
+            try:
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # the client cancelled the question and closed the connection
+                return
+
+    def finish(self):
+        super().finish()
+        # every client has its own thread, which read from the database
+        if self.server.release is not None:
+            self.server.release()
+
+
+class ChatServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path: str,
+        answer: Callable[[str], str],
+        with_expansions: bool = False,
+        fast: bool = False,
+        release: Optional[Callable[[], None]] = None,
+    ):
+        self.answer = answer
+        self.release = release
+        self.with_expansions = with_expansions
+        self.fast = fast
+        super().__init__(path, ChatHandler)
+
+
+def _open_socket(path: str) -> Optional[socket.socket]:
+    if not os.path.exists(path):
+        return None
+    client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client_socket.connect(path)
+    except OSError:
+        client_socket.close()
+        return None
+    return client_socket
+
+
+class DaemonClient:
+    def __init__(
+        self,
+        path: str,
+        client_socket: socket.socket,
+        with_expansions: bool = False,
+        fast: bool = False,
+    ):
+        self.path = path
+        self.with_expansions = with_expansions
+        self.fast = fast
+        self.socket = client_socket
+        self.file = client_socket.makefile("rwb")
+
+    def ask(self, question: str) -> str:
+        if self.file is None:
+            client_socket = _open_socket(self.path)
+            if client_socket is None:
+                raise ConnectionError("The chat daemon is no longer running")
+            self.socket = client_socket
+            self.file = client_socket.makefile("rwb")
+        request = {
+            "question": question,
+            "with_expansions": self.with_expansions,
+            "fast": self.fast,
+        }
+        try:
+            self.file.write(json.dumps(request).encode("utf-8") + b"\n")
+            self.file.flush()
+            line = self.file.readline()
+        except KeyboardInterrupt:
+            # the answer to a cancelled question must not answer the next one
+            self.close()
+            raise
+        if not line:
+            raise ConnectionError("The chat daemon closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["answer"]
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.socket.close()
+        self.file = None
+
+
+def connect(
+    path: str = CHAT_SOCKET, with_expansions: bool = False, fast: bool = False
+) -> Optional[DaemonClient]:
+    client_socket = _open_socket(path)
+    if client_socket is None:
+        return None
+    return DaemonClient(path, client_socket, with_expansions, fast)
+
+
+def serve(
+    db: Database,
+    qdrant,
+    with_expansions: bool = False,
+    fast: bool = False,
+    verbose: bool = False,
+    path: str = CHAT_SOCKET,
+):
+    from .chat import Recommender
+    from .encoder import get_encoder
+
+    client = connect(path)
+    if client is not None:
+        client.close()
+        raise EnvironmentError(f"A chat daemon is already listening on {path}")
+    if os.path.exists(path):
+        # left behind by a daemon that was killed
+        os.remove(path)
+
+    recommender = Recommender(db, qdrant, with_expansions, fast, verbose)
+    get_encoder()
+    with ChatServer(
+        path, recommender.answer, with_expansions, fast, db.release
+    ) as server:
+        print(f"Chat daemon listening on {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
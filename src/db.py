@@ -1,18 +1,116 @@
 #!/usr/bin/env python3
 
+import os
+import queue
 import sqlite3
-from typing import List
+import threading
+import weakref
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
 
-from .models import Category, Game, Mechanism, Type
+from .models import Category, Classification, Game, Mechanism, Type
+
+
+class _ConnectionOwner:
+    # kept in the thread local, collected when its thread finishes
+    pass
 
 
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect("game-library.db")
-        self.conn.row_factory = sqlite3.Row
-        self.db_cursor = self.conn.cursor()
+    # every thread reads with its own read-only connection, which is closed
+    # when the thread finishes, while all writes are executed one after
+    # another by a single writer thread
+    def __init__(self, path: str = "game-library.db"):
+        self.path = path
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.writes = queue.Queue()
+        connected = Future()
+        self.writer = threading.Thread(
+            target=self._run_writer, args=(connected,), daemon=True
+        )
+        self.writer.start()
+        # the writer creates the database file before anybody reads it
+        connected.result()
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        if read_only:
+            uri = f"{Path(self.path).absolute().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -16000")
+        conn.row_factory = sqlite3.Row
+        with self.connections_lock:
+            self.connections.append(conn)
+        self.local.conn = conn
+        self.local.db_cursor = conn.cursor()
+        self.local.owner = _ConnectionOwner()
+        self.local.release = weakref.finalize(self.local.owner, self._release, conn)
+        return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        with self.connections_lock:
+            if conn not in self.connections:
+                return
+            self.connections.remove(conn)
+        conn.close()
+
+    def release(self):
+        # closes the connection of the calling thread before the thread ends
+        if not hasattr(self.local, "conn"):
+            return
+        self.local.release()
+        del self.local.conn, self.local.db_cursor, self.local.owner
+        del self.local.release
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if not hasattr(self.local, "conn"):
+            self._connect(read_only=True)
+        return self.local.conn
+
+    @property
+    def db_cursor(self) -> sqlite3.Cursor:
+        if not hasattr(self.local, "db_cursor"):
+            self._connect(read_only=True)
+        return self.local.db_cursor
+
+    def _run_writer(self, connected: Future):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            connected.set_exception(e)
+            return
+        connected.set_result(True)
+
+        while True:
+            write = self.writes.get()
+            if write is None:
+                break
+            function, args, future = write
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                conn.rollback()
+                future.set_exception(e)
+
+    def _write(self, function: Callable, *args):
+        if not self.writer.is_alive():
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        future = Future()
+        self.writes.put((function, args, future))
+        return future.result()
 
     def create_tables(self):
+        self._write(self._create_tables)
+
+    def _create_tables(self):
         self.db_cursor.execute(
             """CREATE TABLE IF NOT EXISTS type (
                 bgg_id INTEGER PRIMARY KEY,
@@ -54,9 +152,13 @@ class Database:
                 min_players INTEGER,
                 max_players INTEGER,
                 min_playtime INTEGER,
-                max_playtime INTEGER
+                max_playtime INTEGER,
+                updated_at TEXT,
+                content_hash TEXT
             )"""
         )
+        self._add_column("game", "updated_at", "TEXT")
+        self._add_column("game", "content_hash", "TEXT")
 
         self.db_cursor.execute(
             """CREATE TABLE IF NOT EXISTS game_type (
@@ -88,42 +190,37 @@ class Database:
             )"""
         )
 
-    def insert_data(self, games: List[Game]):
-        for game in games:
-            self._insert_game(game)
-            self._insert_classifications(game.types, "type", "game_type", game.bgg_id)
-            self._insert_classifications(
-                game.categories, "category", "game_category", game.bgg_id
-            )
-            self._insert_classifications(
-                game.mechanisms, "mechanism", "game_mechanism", game.bgg_id
-            )
-            self.conn.commit()
+        # the primary keys of the link tables only cover lookups by game
+        self.db_cursor.execute(
+            "CREATE INDEX IF NOT EXISTS game_type_type_id ON game_type (type_id)"
+        )
+        self.db_cursor.execute(
+            "CREATE INDEX IF NOT EXISTS game_category_category_id ON game_category (category_id)"
+        )
+        self.db_cursor.execute(
+            "CREATE INDEX IF NOT EXISTS game_mechanism_mechanism_id ON game_mechanism (mechanism_id)"
+        )
+        self.db_cursor.execute(
+            "CREATE INDEX IF NOT EXISTS game_expansion ON game (expansion, bgg_id)"
+        )
 
-    def _insert_game(self, game: Game):
-        self.db_cursor.execute("SELECT * FROM game WHERE bgg_id = ?", (game.bgg_id,))
-        if self.db_cursor.fetchone():
+    def _add_column(self, table_name: str, column: str, definition: str):
+        # columns added after the first release are missing in older databases
+        self.db_cursor.execute(f"PRAGMA table_info({table_name})")
+        if column not in [row["name"] for row in self.db_cursor.fetchall()]:
             self.db_cursor.execute(
-                "UPDATE game SET title = ?, description = ?, year = ?, bgg_rating = ?, complexity = ?, bgg_url = ?, image_url = ?, expansion = ?, min_players = ?, max_players = ?, min_playtime = ?, max_playtime = ? WHERE bgg_id = ?",
-                (
-                    game.title,
-                    game.description,
-                    game.year,
-                    game.bgg_rating,
-                    game.complexity,
-                    game.bgg_url,
-                    game.image_url,
-                    game.expansion,
-                    game.min_players,
-                    game.max_players,
-                    game.min_playtime,
-                    game.max_playtime,
-                    game.bgg_id,
-                ),
+                f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}"
             )
-        else:
-            self.db_cursor.execute(
-                "INSERT INTO game (bgg_id, title, description, year, bgg_rating, complexity, bgg_url, image_url, expansion, min_players, max_players, min_playtime, max_playtime) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+
+    def insert_data(self, games: List[Game]):
+        self._write(self._insert_data, games)
+
+    def _insert_data(self, games: List[Game]):
+        game_rows = []
+        classification_rows = {"type": {}, "category": {}, "mechanism": {}}
+        link_rows = {"type": [], "category": [], "mechanism": []}
+        for game in games:
+            game_rows.append(
                 (
                     game.bgg_id,
                     game.title,
@@ -138,103 +235,194 @@ class Database:
                     game.max_players,
                     game.min_playtime,
                     game.max_playtime,
-                ),
-            )
-
-    def _insert_classifications(
-        self, classifications, table_name, link_table_name, game_id
-    ):
-
-        for classification in classifications:
-            # classification insert/update
-            self.db_cursor.execute(
-                f"SELECT * FROM {table_name} WHERE bgg_id = ?", (classification.bgg_id,)
+                    game.content_hash,
+                )
             )
-            if not self.db_cursor.fetchone():
-                self.db_cursor.execute(
-                    f"INSERT INTO {table_name} (bgg_id, name, bgg_url, description) VALUES (?, ?, ?, ?)",
-                    (
+            for table_name, classifications in (
+                ("type", game.types),
+                ("category", game.categories),
+                ("mechanism", game.mechanisms),
+            ):
+                for classification in classifications:
+                    classification_rows[table_name][classification.bgg_id] = (
                         classification.bgg_id,
                         classification.name,
                         classification.bgg_url,
                         classification.description,
-                    ),
-                )
-            else:
-                self.db_cursor.execute(
-                    f"UPDATE {table_name} SET name = ?, bgg_url = ?, description = ? WHERE bgg_id = ?",
-                    (
-                        classification.name,
-                        classification.bgg_url,
-                        classification.description,
-                        classification.bgg_id,
-                    ),
-                )
+                    )
+                    link_rows[table_name].append((game.bgg_id, classification.bgg_id))
 
-            # Many-To-Many relationship between games and classifications
-            self.db_cursor.execute(
-                f"SELECT * FROM {link_table_name} WHERE game_id = ? AND {table_name}_id = ?",
-                (game_id, classification.bgg_id),
+        # one transaction for the whole batch
+        with self.conn:
+            self.db_cursor.executemany(
+                """INSERT INTO game (bgg_id, title, description, year, bgg_rating, complexity, bgg_url, image_url, expansion, min_players, max_players, min_playtime, max_playtime, content_hash, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (bgg_id) DO UPDATE SET title = excluded.title, description = excluded.description, year = excluded.year, bgg_rating = excluded.bgg_rating, complexity = excluded.complexity, bgg_url = excluded.bgg_url, image_url = excluded.image_url, expansion = excluded.expansion, min_players = excluded.min_players, max_players = excluded.max_players, min_playtime = excluded.min_playtime, max_playtime = excluded.max_playtime, content_hash = excluded.content_hash, updated_at = excluded.updated_at""",
+                game_rows,
             )
-            if not self.db_cursor.fetchone():
-                self.db_cursor.execute(
-                    f"INSERT INTO {link_table_name} (game_id, {table_name}_id) VALUES (?, ?)",
-                    (game_id, classification.bgg_id),
+            for table_name, rows in classification_rows.items():
+                self.db_cursor.executemany(
+                    f"""INSERT INTO {table_name} (bgg_id, name, bgg_url, description) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (bgg_id) DO UPDATE SET name = excluded.name, bgg_url = excluded.bgg_url, description = COALESCE(excluded.description, {table_name}.description)""",
+                    rows.values(),
+                )
+                self.db_cursor.executemany(
+                    f"INSERT OR IGNORE INTO game_{table_name} (game_id, {table_name}_id) VALUES (?, ?)",
+                    link_rows[table_name],
                 )
 
     def get_classification_by_id(self, bgg_id: int, classification: str):
         self.db_cursor.execute(
-            f"SELECT * FROM {classification} WHERE bgg_id = {bgg_id}",
+            f"SELECT * FROM {classification} WHERE bgg_id = ?",
+            (bgg_id,),
         )
         return self.db_cursor.fetchone()
 
+    def get_classifications(self, without_description: bool = False):
+        where = "WHERE description IS NULL" if without_description else ""
+        self.db_cursor.execute(
+            f"""SELECT 'type' AS classification, bgg_id, name, bgg_url, description FROM type {where}
+            UNION ALL
+            SELECT 'category', bgg_id, name, bgg_url, description FROM category {where}
+            UNION ALL
+            SELECT 'mechanism', bgg_id, name, bgg_url, description FROM mechanism {where}"""
+        )
+        return self.db_cursor.fetchall()
+
+    def update_descriptions(self, classifications: List[Classification]):
+        self._write(self._update_descriptions, classifications)
+
+    def _update_descriptions(self, classifications: List[Classification]):
+        for classification in classifications:
+            self.db_cursor.execute(
+                f"UPDATE {classification.get_type().lower()} SET description = ? WHERE bgg_id = ?",
+                (classification.description, classification.bgg_id),
+            )
+        self.conn.commit()
+
+    def delete_games_except(
+        self, bgg_ids: List[int], with_expansions: bool = False
+    ) -> List[int]:
+        # games or expansions that left the BGG collection
+        keep = set(bgg_ids)
+        removed_ids = [
+            bgg_id
+            for bgg_id in self.get_content_hashes(with_expansions)
+            if bgg_id not in keep
+        ]
+        if removed_ids:
+            self._write(self._delete_games, removed_ids)
+        return removed_ids
+
+    def _delete_games(self, bgg_ids: List[int]):
+        rows = [(bgg_id,) for bgg_id in bgg_ids]
+        with self.conn:
+            for table_name in ["game_type", "game_category", "game_mechanism"]:
+                self.db_cursor.executemany(
+                    f"DELETE FROM {table_name} WHERE game_id = ?", rows
+                )
+            self.db_cursor.executemany("DELETE FROM game WHERE bgg_id = ?", rows)
+
+    def update_content_hashes(self, content_hashes: Dict[int, str]):
+        self._write(self._update_content_hashes, content_hashes)
+
+    def _update_content_hashes(self, content_hashes: Dict[int, str]):
+        with self.conn:
+            self.db_cursor.executemany(
+                "UPDATE game SET content_hash = ? WHERE bgg_id = ?",
+                [
+                    (content_hash, bgg_id)
+                    for bgg_id, content_hash in content_hashes.items()
+                ],
+            )
+
     def get_game_ids(self):
         self.db_cursor.execute("SELECT bgg_id FROM game")
         return [entry["bgg_id"] for entry in self.db_cursor.fetchall()]
 
-    def get_games(self, with_expansions: bool = False) -> List[Game]:
-        with_expansions = int(with_expansions)
-        query = f"""
-            SELECT g.bgg_id, g.title, g.description, g.year, g.bgg_rating, g.complexity,
-                g.bgg_url, g.image_url, g.min_players, g.max_players, g.min_playtime, g.max_playtime,
-                (SELECT GROUP_CONCAT(DISTINCT c.bgg_id || ':' || c.name)
-                    FROM category c
-                    JOIN game_category gc ON gc.category_id = c.bgg_id
-                    WHERE gc.game_id = g.bgg_id) AS categories,
-                (SELECT GROUP_CONCAT(DISTINCT t.bgg_id || ':' || t.name)
-                    FROM type t
-                    JOIN game_type gt ON gt.type_id = t.bgg_id
-                    WHERE gt.game_id = g.bgg_id) AS types,
-                (SELECT GROUP_CONCAT(DISTINCT m.bgg_id || ':' || m.name)
-                    FROM mechanism m
-                    JOIN game_mechanism gm ON gm.mechanism_id = m.bgg_id
-                    WHERE gm.game_id = g.bgg_id) AS mechanisms
-            FROM game g
-            WHERE g.expansion = {with_expansions}
-            GROUP BY g.bgg_id
-        """
-
-        self.db_cursor.execute(query)
+    def get_content_hashes(self, with_expansions: bool = False) -> Dict[int, str]:
+        self.db_cursor.execute(
+            "SELECT bgg_id, content_hash FROM game WHERE expansion = ?",
+            (int(with_expansions),),
+        )
+        return {row["bgg_id"]: row["content_hash"] for row in self.db_cursor}
+
+    def iter_games(
+        self,
+        batch_size: int = 500,
+        since: str = None,
+        with_expansions: bool = False,
+    ) -> Iterator[List[Game]]:
+        # pages are read in separate queries so no read transaction stays open
+        after_id = None
+        while games := self.get_games(with_expansions, after_id, batch_size, since):
+            yield games
+            after_id = games[-1].bgg_id
+
+    def get_games(
+        self,
+        with_expansions: bool = False,
+        after_id: int = None,
+        limit: int = None,
+        since: str = None,
+        bgg_ids: List[int] = None,
+    ) -> List[Game]:
+        # keyset pagination over bgg_id, the same selection is reused for the links
+        selection = "SELECT bgg_id FROM game WHERE expansion = ?"
+        params = [int(with_expansions)]
+        if since is not None:
+            selection += " AND updated_at >= ?"
+            params.append(since)
+        if after_id is not None:
+            selection += " AND bgg_id > ?"
+            params.append(after_id)
+        if bgg_ids is not None:
+            selection += f" AND bgg_id IN ({', '.join('?' for _ in bgg_ids)})"
+            params.extend(bgg_ids)
+        selection += " ORDER BY bgg_id"
+        if limit is not None:
+            selection += " LIMIT ?"
+            params.append(limit)
+
+        self.db_cursor.execute(
+            f"""SELECT bgg_id, title, description, year, bgg_rating, complexity, bgg_url,
+                image_url, min_players, max_players, min_playtime, max_playtime,
+                content_hash
+            FROM game
+            WHERE bgg_id IN ({selection})
+            ORDER BY bgg_id""",
+            params,
+        )
         rows = self.db_cursor.fetchall()
 
+        classifications = {
+            row["bgg_id"]: {"type": [], "category": [], "mechanism": []} for row in rows
+        }
+        class_map = {"type": Type, "category": Category, "mechanism": Mechanism}
+        for table_name, classification_class in class_map.items():
+            self.db_cursor.execute(
+                f"""SELECT l.game_id, c.bgg_id, c.name, c.bgg_url, c.description
+                FROM game_{table_name} l
+                JOIN {table_name} c ON c.bgg_id = l.{table_name}_id
+                WHERE l.game_id IN ({selection})""",
+                params,
+            )
+            for link in self.db_cursor:
+                classifications[link["game_id"]][table_name].append(
+                    # the same values as the registry, so both share the instance
+                    classification_class.intern(
+                        link["bgg_id"],
+                        link["name"],
+                        link["bgg_url"],
+                        link["description"],
+                    )
+                )
+
         games = []
         for row in rows:
-            categories, types, mechanisms = [], [], []
-            if row["categories"]:
-                categories = [
-                    Category(int(cat.split(":")[0]), cat.split(":")[1])
-                    for cat in row["categories"].split(",")
-                ]
-            if row["types"]:
-                types = [
-                    Type(int(game_type.split(":")[0]), game_type.split(":")[1])
-                    for game_type in row["types"].split(",")
-                ]
-            if row["mechanisms"]:
-                mechanisms = [
-                    Mechanism(int(mech.split(":")[0]), mech.split(":")[1])
-                    for mech in row["mechanisms"].split(",")
-                ]
+            types = classifications[row["bgg_id"]]["type"]
+            categories = classifications[row["bgg_id"]]["category"]
+            mechanisms = classifications[row["bgg_id"]]["mechanism"]
             description = row[
                 "description"
             ] or "{title}, {minp}-{maxp}, {minpt}-{maxpt}, {types}, {categories}, {mechanisms}".format(
@@ -264,10 +452,24 @@ class Database:
                 categories=categories,
                 types=types,
                 mechanisms=mechanisms,
+                expansion=with_expansions,
+                content_hash=row["content_hash"],
             )
             games.append(game)
 
         return games
 
+    def revision(self) -> Tuple[int, int]:
+        # changes when any connection, e.g. of a running ingest, commits
+        return tuple(
+            os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+            for path in [self.path, f"{self.path}-wal"]
+        )
+
     def close(self):
-        self.conn.close()
+        self.writes.put(None)
+        self.writer.join()
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
@@ -0,0 +1,176 @@
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+
+from .encoder import ENCODER_KEY, get_encoder
+
+EMBEDDING_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "embedding_cache",
+)
+
+
+class EmbeddingCache:
+    # append-only files: one text hash per line in keys.txt and the vector of
+    # the same row in vectors.bin, which is read through a memory map. Several
+    # ingests share the files, so they are only touched under a file lock
+    def __init__(self, cache_dir: str, model_name: str, dtype: str):
+        self.dtype = np.dtype(dtype)
+        self.directory = os.path.join(
+            cache_dir, f"{model_name.replace('/', '--')}-{self.dtype.name}"
+        )
+        self.dimension_path = os.path.join(self.directory, "dimension.txt")
+        self.keys_path = os.path.join(self.directory, "keys.txt")
+        self.vectors_path = os.path.join(self.directory, "vectors.bin")
+        self.lock_path = os.path.join(self.directory, "lock")
+        self.lock = threading.Lock()
+        self.rows: Dict[str, int] = {}
+        self.keys_offset = 0
+        self.dimension = None
+        self.vectors = None
+        if os.path.isdir(self.directory):
+            with self._locked():
+                self._refresh()
+
+    @contextmanager
+    def _locked(self):
+        with self.lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        # reads the rows other processes appended since the last call
+        if self.dimension is None:
+            if not os.path.exists(self.dimension_path):
+                return
+            with open(self.dimension_path) as dimension_file:
+                self.dimension = int(dimension_file.read())
+        row_size = self.dimension * self.dtype.itemsize
+        data = b""
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as keys_file:
+                keys_file.seek(self.keys_offset)
+                data = keys_file.read()
+        new_keys = data[: data.rfind(b"\n") + 1].decode("ascii").split()
+        size = 0
+        if os.path.exists(self.vectors_path):
+            size = os.path.getsize(self.vectors_path)
+        count = min(len(self.rows) + len(new_keys), size // row_size)
+        new_keys = new_keys[: max(count - len(self.rows), 0)]
+        keys_size = self.keys_offset + sum(len(key) + 1 for key in new_keys)
+        if keys_size != self.keys_offset + len(data) or count * row_size != size:
+            # drop the rows of a process that died while writing
+            with open(self.keys_path, "ab") as keys_file:
+                keys_file.truncate(keys_size)
+            with open(self.vectors_path, "ab") as vectors_file:
+                vectors_file.truncate(count * row_size)
+        for key in new_keys:
+            self.rows[key] = len(self.rows)
+        self.keys_offset = keys_size
+        if self.rows:
+            self._map(len(self.rows))
+
+    def _map(self, count: int):
+        self.vectors = np.memmap(
+            self.vectors_path,
+            dtype=self.dtype,
+            mode="r",
+            shape=(count, self.dimension),
+        )
+
+    def get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        with self.lock:
+            return {
+                key: np.asarray(self.vectors[self.rows[key]], dtype=np.float32)
+                for key in keys
+                if key in self.rows
+            }
+
+    def put(self, keys: List[str], vectors: np.ndarray):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._locked():
+            if not os.path.exists(self.dimension_path):
+                with open(self.dimension_path, "w") as dimension_file:
+                    dimension_file.write(str(vectors.shape[1]))
+            self._refresh()
+            new_rows = {}
+            for key, vector in zip(keys, vectors):
+                # another process may have encoded the same text meanwhile
+                if key not in self.rows and key not in new_rows:
+                    new_rows[key] = vector
+            if not new_rows:
+                return
+            size = 0
+            if os.path.exists(self.vectors_path):
+                size = os.path.getsize(self.vectors_path)
+            row = size // (self.dimension * self.dtype.itemsize)
+            with open(self.vectors_path, "ab") as vectors_file:
+                vectors_file.write(
+                    np.asarray(list(new_rows.values()), dtype=self.dtype).tobytes()
+                )
+            keys_data = "".join(f"{key}\n" for key in new_rows).encode("ascii")
+            with open(self.keys_path, "ab") as keys_file:
+                keys_file.write(keys_data)
+            for key in new_rows:
+                self.rows[key] = row
+                row += 1
+            self.keys_offset += len(keys_data)
+            self._map(row)
+
+
+class EmbeddingService:
+    batch_size = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+    cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", EMBEDDING_CACHE_DIR)
+    cache_dtype = os.environ.get("EMBEDDING_CACHE_DTYPE", "float32")
+
+    def __init__(self, model_name: str = ENCODER_KEY, verbose: bool = False):
+        self.model_name = model_name
+        self.verbose = verbose
+        self.cache = EmbeddingCache(self.cache_dir, model_name, self.cache_dtype)
+        self.hits = 0
+        self.misses = 0
+        self.encoded = 0
+        self.encode_duration = 0.0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        vectors = self.cache.get(keys)
+        self.hits += sum(1 for key in keys if key in vectors)
+        self.misses += sum(1 for key in keys if key not in vectors)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[i : i + self.batch_size]
+            start = time.perf_counter()
+            batch_vectors = np.asarray(
+                get_encoder().encode(
+                    [missing[key] for key in batch_keys], batch_size=self.batch_size
+                ),
+                dtype=np.float32,
+            )
+            self.encode_duration += time.perf_counter() - start
+            self.encoded += len(batch_keys)
+            self.cache.put(batch_keys, batch_vectors)
+            vectors.update(zip(batch_keys, batch_vectors))
+
+        return np.array([vectors[key] for key in keys], dtype=np.float32)
+
+    def report(self):
+        requested = self.hits + self.misses
+        hit_rate = self.hits / requested * 100 if requested else 0
+        rate = self.encoded / self.encode_duration if self.encode_duration else 0
+        print(
+            f"Embeddings: {self.hits} cached, {self.misses} missed "
+            f"({hit_rate:.1f}% hit rate), {self.encoded} encoded "
+            f"in {self.encode_duration:.2f}s ({rate:.1f} texts/s)"
+        )
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+from typing import List, Union
+
+import numpy as np
+
+ENCODER_NAME = os.environ.get("SENTENCE_TRANFORMER_MODEL", "all-MiniLM-L6-v2")
+ENCODER_BACKEND = os.environ.get("SENTENCE_TRANSFORMER_BACKEND", "torch")
+ONNX_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "models",
+    "onnx",
+    ENCODER_NAME.replace("/", "--"),
+)
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model-int8.onnx"}
+# vectors of different backends differ slightly and are cached separately
+ENCODER_KEY = (
+    ENCODER_NAME if ENCODER_BACKEND == "torch" else f"{ENCODER_NAME}-{ENCODER_BACKEND}"
+)
+
+_encoder = None
+_lock = threading.Lock()
+
+
+class OnnxEncoder:
+    # runs the exported transformer with onnxruntime and pools like the
+    # sentence transformer, without importing torch
+    batch_size = 32
+
+    def __init__(self, directory: str = ONNX_DIR, file_name: str = "model.onnx"):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, "encoder.json")) as config_file:
+            config = json.load(config_file)
+        self.dimension = config["dimension"]
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, file_name), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {
+            model_input.name for model_input in self.session.get_inputs()
+        }
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(
+        self, sentences: Union[str, List[str]], batch_size: int = None
+    ) -> np.ndarray:
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        batch_size = batch_size or self.batch_size
+        vectors = [np.zeros((0, self.dimension), dtype=np.float32)]
+        for i in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[i : i + batch_size])
+            attention_mask = np.array(
+                [encoding.attention_mask for encoding in encodings], dtype=np.int64
+            )
+            inputs = {
+                "input_ids": np.array(
+                    [encoding.ids for encoding in encodings], dtype=np.int64
+                ),
+                "attention_mask": attention_mask,
+                "token_type_ids": np.array(
+                    [encoding.type_ids for encoding in encodings], dtype=np.int64
+                ),
+            }
+            hidden_state = self.session.run(
+                None,
+                {
+                    name: value
+                    for name, value in inputs.items()
+                    if name in self.input_names
+                },
+            )[0]
+            if self.pooling == "cls":
+                embeddings = hidden_state[:, 0]
+            else:
+                mask = attention_mask[..., None].astype(np.float32)
+                embeddings = (hidden_state * mask).sum(axis=1) / np.clip(
+                    mask.sum(axis=1), 1e-9, None
+                )
+            if self.normalize:
+                embeddings = embeddings / np.clip(
+                    np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None
+                )
+            vectors.append(embeddings.astype(np.float32))
+        vectors = np.concatenate(vectors)
+        return vectors[0] if isinstance(sentences, str) else vectors
+
+
+def create_encoder(backend: str = ENCODER_BACKEND):
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(
+            ENCODER_NAME,
+            tokenizer_kwargs={
+                "clean_up_tokenization_spaces": False,
+            },
+        )
+    if backend not in ONNX_FILES:
+        raise ValueError(
+            f"Unknown SENTENCE_TRANSFORMER_BACKEND {backend}, "
+            f"use torch or one of {', '.join(ONNX_FILES)}"
+        )
+    if not os.path.exists(os.path.join(ONNX_DIR, ONNX_FILES[backend])):
+        raise EnvironmentError(
+            f"No ONNX export of {ENCODER_NAME} found, run python -m src.encoder first"
+        )
+    return OnnxEncoder(ONNX_DIR, ONNX_FILES[backend])
+
+
+def get_encoder():
+    # one model per process, loaded on first use
+    global _encoder
+    if _encoder is None:
+        with _lock:
+            if _encoder is None:
+                _encoder = create_encoder()
+    return _encoder
+
+
+def export_onnx(directory: str = ONNX_DIR):
+    # needs torch once, the exported models only need onnxruntime and tokenizers
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(ENCODER_NAME)
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    if pooling.pooling_mode_cls_token:
+        pooling_mode = "cls"
+    elif pooling.pooling_mode_mean_tokens:
+        pooling_mode = "mean"
+    else:
+        raise ValueError(f"Pooling of {ENCODER_NAME} is not supported")
+
+    os.makedirs(directory, exist_ok=True)
+    tokenizer = model.tokenizer.backend_tokenizer
+    tokenizer.enable_truncation(model.max_seq_length)
+    tokenizer.enable_padding(
+        pad_id=model.tokenizer.pad_token_id, pad_token=model.tokenizer.pad_token
+    )
+    tokenizer.save(os.path.join(directory, "tokenizer.json"))
+    with open(os.path.join(directory, "encoder.json"), "w") as config_file:
+        json.dump(
+            {
+                "model": ENCODER_NAME,
+                "dimension": model.get_sentence_embedding_dimension(),
+                "pooling": pooling_mode,
+                "normalize": any(isinstance(module, Normalize) for module in model),
+            },
+            config_file,
+        )
+
+    transformer = model[0].auto_model.eval()
+    inputs = model.tokenizer(["Export"], return_tensors="pt")
+    input_names = [
+        name
+        for name in ["input_ids", "attention_mask", "token_type_ids"]
+        if name in inputs
+    ]
+    model_path = os.path.join(directory, ONNX_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(inputs[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                name: {0: "batch", 1: "sequence"}
+                for name in input_names + ["last_hidden_state"]
+            },
+            opset_version=14,
+            dynamo=False,
+        )
+    print(f"Exported {ENCODER_NAME} to {model_path}")
+
+    quantized_path = os.path.join(directory, ONNX_FILES["onnx-int8"])
+    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    print(f"Quantized {ENCODER_NAME} to {quantized_path}")
+
+
+if __name__ == "__main__":
+    export_onnx()
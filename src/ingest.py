@@ -0,0 +1,87 @@
+from .bgg import BGG
+from .db import Database
+from .models import Category, Mechanism, Type
+from .pipeline import IngestPipeline
+from .qdrant import Qdrant
+
+
+def setup(
+    db: Database,
+    qdrant: Qdrant,
+    bgg_username: str,
+    with_expansions: bool = False,
+    refresh_data: bool = False,
+    backend: str = "api",
+    offline: bool = False,
+    verbose: bool = False,
+):
+    if verbose:
+        print("Create tables")
+    db.create_tables()
+    game_ids = db.get_game_ids()
+
+    if verbose:
+        print("Create Qdrant collection")
+    qdrant.create_collection()
+    qdrant.load_content_hashes()
+    pipeline = IngestPipeline(db, qdrant, with_expansions, verbose)
+    if pipeline.checkpoint.resumed:
+        print("Resume interrupted ingest")
+
+    if verbose:
+        print("Get data from bgg collection")
+    bgg = BGG(bgg_username, backend, offline, verbose, refresh_data)
+    # the offline mode re-parses every cached page
+    if (refresh_data or offline) and verbose:
+        print("Refresh data from bgg collection")
+    bgg.set_db_bgg_ids(pipeline.checkpoint.skip_ids(game_ids, refresh_data or offline))
+    bgg.set_db_classifications(db.get_classifications())
+    bgg.set_game_sink(pipeline.put)
+
+    if verbose:
+        print("Stream data into database and Qdrant collection")
+    pipeline.start()
+    try:
+        bgg.get_data_from_collection()
+    except BaseException:
+        # keep everything processed so far and the checkpoint to resume
+        pipeline.close(completed=False)
+        raise
+    pipeline.close()
+    if verbose:
+        for counter in bgg.counters:
+            print(counter)
+        pipeline.report()
+
+    if bgg.collection_ids:
+        removed_ids = db.delete_games_except(bgg.collection_ids, with_expansions)
+        if verbose and removed_ids:
+            print(f"Removed {len(removed_ids)} games that left the BGG collection")
+
+    if verbose:
+        print("Sync the Qdrant collection with the database")
+    qdrant.sync_collection(with_expansions)
+    qdrant.publish()
+    qdrant.report()
+    if verbose:
+        qdrant.embeddings.report()
+
+
+def hydrate(
+    db: Database,
+    bgg_username: str,
+    backend: str = "api",
+    offline: bool = False,
+    verbose: bool = False,
+):
+    db.create_tables()
+    class_map = {"type": Type, "category": Category, "mechanism": Mechanism}
+    classifications = [
+        class_map[row["classification"]](row["bgg_id"], row["name"], row["bgg_url"])
+        for row in db.get_classifications(without_description=True)
+    ]
+    if verbose:
+        print(f"Hydrate {len(classifications)} classifications")
+
+    bgg = BGG(bgg_username, backend, offline, verbose)
+    db.update_descriptions(bgg.hydrate_classifications(classifications))
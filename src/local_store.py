@@ -0,0 +1,356 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client import models
+from qdrant_client.models import PointStruct, Record, ScoredPoint
+
+from .db import Database
+from .encoder import ENCODER_KEY
+from .qdrant import PAYLOAD_SCHEMA, Qdrant, model_prefix
+
+NUMERIC_FIELDS = [
+    field_name
+    for field_name, field_schema in PAYLOAD_SCHEMA.items()
+    if field_schema != models.PayloadSchemaType.KEYWORD
+]
+KEYWORD_FIELDS = [
+    field_name
+    for field_name, field_schema in PAYLOAD_SCHEMA.items()
+    if field_schema == models.PayloadSchemaType.KEYWORD
+]
+
+
+class LocalVectorStore(Qdrant):
+    # keeps the collection in a memory-mapped .npy file next to the database
+    # and answers the searches of the chat without the Qdrant service
+    upload_workers = 0
+
+    def __init__(self, db: Database, verbose: bool = False):
+        super().__init__(None, db, verbose)
+        base_path = os.path.splitext(db.path)[0]
+        self.vectors_path = f"{base_path}.vectors.npy"
+        self.payloads_path = f"{base_path}.vectors.json"
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.count = 0
+        self.ids: List[int] = []
+        self.rows: Dict[int, int] = {}
+        self.payloads: List[Dict] = []
+        self.columns = None
+        self.dirty = False
+        self.loaded = False
+        self.stored_version = None
+
+    def create_collection(self) -> bool:
+        # a new version is built in memory, the chat reads the previous files
+        # until save replaces them
+        self._load()
+        if self.stored_version == self.version_name:
+            return False
+        print(f"Creating collection {self.version_name}")
+        self._reset()
+        self.stored_version = self.version_name
+        self.dirty = True
+        return True
+
+    def _reset(self):
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.count = 0
+        self.ids = []
+        self.rows = {}
+        self.payloads = []
+        self.columns = None
+        self.stored_version = None
+
+    def _load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        if not os.path.exists(self.payloads_path):
+            return
+        with open(self.payloads_path) as payloads_file:
+            stored = json.load(payloads_file)
+        self.stored_version = stored.get("version")
+        self.ids = stored["ids"]
+        self.payloads = stored["payloads"]
+        self.rows = {point_id: row for row, point_id in enumerate(self.ids)}
+        self.count = len(self.ids)
+        if self.count:
+            self.vectors = np.load(self.vectors_path, mmap_mode="r")
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = f"{self.vectors_path}.tmp.npy"
+        np.save(tmp_path, self.vectors[: self.count])
+        os.replace(tmp_path, self.vectors_path)
+        tmp_path = f"{self.payloads_path}.tmp"
+        with open(tmp_path, "w") as payloads_file:
+            json.dump(
+                {
+                    "version": self.stored_version,
+                    "ids": self.ids,
+                    "payloads": self.payloads,
+                },
+                payloads_file,
+            )
+        os.replace(tmp_path, self.payloads_path)
+        self.dirty = False
+
+    def load_content_hashes(self):
+        self._load()
+        for point_id, payload in zip(self.ids, self.payloads):
+            self.content_hashes[point_id] = payload.get("content_hash")
+
+    def sync_collection(self, with_expansions: bool = False):
+        super().sync_collection(with_expansions)
+        self.save()
+
+    def publish(self):
+        pass
+
+    def check_version(self):
+        self._load()
+        if self.stored_version is not None and not self.stored_version.startswith(
+            model_prefix(self.collection_name)
+        ):
+            raise EnvironmentError(
+                f"{self.vectors_path} was built as {self.stored_version} with another "
+                f"model than {ENCODER_KEY}, run ./main.py db first"
+            )
+
+    def index_version(self) -> Optional[int]:
+        # save replaces the file, so every ingest changes its modification time
+        if not os.path.exists(self.payloads_path):
+            return None
+        return os.stat(self.payloads_path).st_mtime_ns
+
+    def reload(self):
+        self._reset()
+        self.loaded = False
+        self.check_version()
+
+    def _reserve(self, count: int, dimension: int):
+        # the memory map is copied into a growing buffer on the first write
+        if (
+            not isinstance(self.vectors, np.memmap)
+            and len(self.vectors) >= count
+            and self.vectors.shape[1] == dimension
+        ):
+            return
+        vectors = np.zeros((max(count, 2 * self.count, 1024), dimension), np.float32)
+        if self.count:
+            vectors[: self.count] = self.vectors[: self.count]
+        self.vectors = vectors
+
+    def upsert_points(self, points: List[PointStruct]):
+        self._load()
+        new_ids = [point.id for point in points if point.id not in self.rows]
+        self._reserve(self.count + len(new_ids), len(points[0].vector))
+        for point in points:
+            row = self.rows.get(point.id)
+            if row is None:
+                row = self.rows[point.id] = self.count
+                self.ids.append(point.id)
+                self.payloads.append(point.payload)
+                self.count += 1
+            else:
+                self.payloads[row] = point.payload
+            vector = np.asarray(point.vector, dtype=np.float32)
+            # normalized once, so the cosine is a dot product
+            self.vectors[row] = vector / max(np.linalg.norm(vector), 1e-12)
+        self.columns = None
+        self.dirty = True
+
+    def delete_points(self, point_ids: List[int]):
+        self._load()
+        self._reserve(self.count, self.vectors.shape[1])
+        for point_id in point_ids:
+            row = self.rows.pop(point_id, None)
+            if row is None:
+                continue
+            # the last row takes the place of the deleted one
+            last = self.count - 1
+            if row != last:
+                self.vectors[row] = self.vectors[last]
+                self.ids[row] = self.ids[last]
+                self.payloads[row] = self.payloads[last]
+                self.rows[self.ids[row]] = row
+            self.ids.pop()
+            self.payloads.pop()
+            self.count -= 1
+        self.columns = None
+        self.dirty = True
+
+    def _build_columns(self) -> Dict:
+        numbers = {
+            field: np.array(
+                [
+                    np.nan if payload.get(field) is None else payload[field]
+                    for payload in self.payloads
+                ],
+                dtype=np.float64,
+            )
+            for field in NUMERIC_FIELDS
+        }
+        keywords = {}
+        for field in KEYWORD_FIELDS:
+            rows: Dict[str, List[int]] = {}
+            for row, payload in enumerate(self.payloads):
+                for value in payload.get(field) or []:
+                    rows.setdefault(value, []).append(row)
+            bitsets = {}
+            for value, value_rows in rows.items():
+                mask = np.zeros(self.count, dtype=bool)
+                mask[value_rows] = True
+                bitsets[value] = np.packbits(mask)
+            keywords[field] = bitsets
+        return {"numbers": numbers, "keywords": keywords}
+
+    def _conditions(self, conditions) -> List:
+        if conditions is None:
+            return []
+        return conditions if isinstance(conditions, list) else [conditions]
+
+    def _filter_mask(self, query_filter: Optional[models.Filter]) -> np.ndarray:
+        mask = np.ones(self.count, dtype=bool)
+        if query_filter is None:
+            return mask
+        for condition in self._conditions(query_filter.must):
+            mask &= self._condition_mask(condition)
+        if query_filter.should is not None:
+            # like in Qdrant, an empty should list matches nothing
+            any_mask = np.zeros(self.count, dtype=bool)
+            for condition in self._conditions(query_filter.should):
+                any_mask |= self._condition_mask(condition)
+            mask &= any_mask
+        for condition in self._conditions(query_filter.must_not):
+            mask &= ~self._condition_mask(condition)
+        return mask
+
+    def _condition_mask(self, condition) -> np.ndarray:
+        if isinstance(condition, models.Filter):
+            return self._filter_mask(condition)
+        if isinstance(condition, models.HasIdCondition):
+            return np.isin(np.array(self.ids, dtype=np.int64), condition.has_id)
+        if isinstance(condition, models.IsEmptyCondition):
+            return self._is_empty(condition.is_empty.key)
+        if isinstance(condition, models.FieldCondition):
+            return self._field_mask(condition)
+        raise ValueError(f"Unsupported filter condition {type(condition).__name__}")
+
+    def _is_empty(self, key: str) -> np.ndarray:
+        if key in self.columns["numbers"]:
+            return np.isnan(self.columns["numbers"][key])
+        if key in self.columns["keywords"]:
+            return ~self._keyword_mask(key, list(self.columns["keywords"][key]))
+        return np.ones(self.count, dtype=bool)
+
+    def _keyword_mask(self, key: str, values: List) -> np.ndarray:
+        bitsets = self.columns["keywords"].get(key, {})
+        combined = np.zeros((self.count + 7) // 8, dtype=np.uint8)
+        for value in values:
+            if value in bitsets:
+                combined |= bitsets[value]
+        return np.unpackbits(combined, count=self.count).astype(bool)
+
+    def _field_mask(self, condition: models.FieldCondition) -> np.ndarray:
+        # like in Qdrant, fields that are missing in the payload never match
+        key = condition.key
+        if condition.range is not None:
+            column = self.columns["numbers"].get(key)
+            if column is None:
+                return np.zeros(self.count, dtype=bool)
+            mask = ~np.isnan(column)
+            if condition.range.gt is not None:
+                mask &= column > condition.range.gt
+            if condition.range.gte is not None:
+                mask &= column >= condition.range.gte
+            if condition.range.lt is not None:
+                mask &= column < condition.range.lt
+            if condition.range.lte is not None:
+                mask &= column <= condition.range.lte
+            return mask
+        if isinstance(condition.match, models.MatchAny):
+            values = condition.match.any
+        elif isinstance(condition.match, models.MatchValue):
+            values = [condition.match.value]
+        else:
+            raise ValueError(f"Unsupported match on {key}")
+        if key in self.columns["numbers"]:
+            return np.isin(self.columns["numbers"][key], values)
+        return self._keyword_mask(key, values)
+
+    def _matching_rows(self, query_filter: Optional[models.Filter]) -> np.ndarray:
+        self._load()
+        if self.columns is None:
+            self.columns = self._build_columns()
+        return np.flatnonzero(self._filter_mask(query_filter))
+
+    def _best(self, rows: np.ndarray, scores: np.ndarray) -> List[ScoredPoint]:
+        if len(rows) > self.limit:
+            best = np.argpartition(-scores, self.limit)[: self.limit]
+        else:
+            best = np.arange(len(rows))
+        best = best[np.argsort(-scores[best])]
+        return [
+            ScoredPoint(
+                id=self.ids[rows[index]],
+                version=0,
+                score=float(scores[index]),
+                payload=self.payloads[rows[index]],
+            )
+            for index in best
+        ]
+
+    def _query(self, query_vector: List[float]) -> np.ndarray:
+        query = np.asarray(query_vector, dtype=np.float32)
+        return query / max(np.linalg.norm(query), 1e-12)
+
+    def _search_rows(self, rows: np.ndarray, query_vector: List[float]):
+        query = self._query(query_vector)
+        if len(rows) * 4 > self.count:
+            # scoring every vector is cheaper than copying most of them
+            scores = (self.vectors[: self.count] @ query)[rows]
+        else:
+            scores = self.vectors[rows] @ query
+        return self._best(rows, scores)
+
+    def client_search(self, query_filter: models.Filter, query_vector: List[float]):
+        rows = self._matching_rows(query_filter)
+        if not len(rows):
+            return []
+        return self._search_rows(rows, query_vector)
+
+    def _first_by_id(self, rows: np.ndarray) -> Tuple[List[Record], Optional[int]]:
+        # like Qdrant, ordered by id with the next id as offset
+        rows = sorted(rows, key=lambda row: self.ids[row])
+        records = [
+            Record(id=self.ids[row], payload=self.payloads[row])
+            for row in rows[: self.limit]
+        ]
+        next_offset = self.ids[rows[self.limit]] if len(rows) > self.limit else None
+        return records, next_offset
+
+    def client_scroll(
+        self, scroll_filter: models.Filter
+    ) -> Tuple[List[Record], Optional[int]]:
+        return self._first_by_id(self._matching_rows(scroll_filter))
+
+    def search_tiers(
+        self,
+        filters: List[models.Filter],
+        query_vector: Optional[List[float]] = None,
+        batch: bool = True,
+    ) -> Tuple[List, Optional[int]]:
+        # the tiers are masks over the same columns, only the vectors of the
+        # answering tier are scored
+        for tier, query_filter in enumerate(filters):
+            rows = self._matching_rows(query_filter)
+            if not len(rows):
+                continue
+            if query_vector is None:
+                return self._first_by_id(rows)[0], tier
+            return self._search_rows(rows, query_vector), tier
+        return [], None
@@ -2,82 +2,52 @@ import os
 import sys
 from typing import Dict
 
-import requests
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
-
-from .bgg import BGG
-from .chat import run as run_chat
 from .db import Database
-from .qdrant import Qdrant
 
 NO_GAME_FOUND_MSG = "No suitable game models were found based on your request."
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "qdrant")
 
 
-def setup(
-    db: Database,
-    client: QdrantClient,
-    model: SentenceTransformer,
-    bgg_username: str,
-    with_expansions: bool = False,
-    refresh_data: bool = False,
-    verbose: bool = False,
-):
-    if verbose:
-        print("Create tables")
-    db.create_tables()
-    game_ids = db.get_game_ids()
+def connect_qdrant(verbose: bool = False):
+    # the heavy dependencies are imported by the subcommand that needs them
+    from .qdrant import get_client
 
     if verbose:
-        print("Get data from bgg collection")
-    bgg = BGG(bgg_username, verbose)
-    if refresh_data and verbose:
-        print("Refresh data from bgg collection")
-    else:
-        bgg.set_db_bgg_ids(game_ids)
-    bgg.get_data_from_collection()
+        print("Initializing QdrantClient")
+    return get_client()
 
-    if verbose:
-        print("insert data into database")
-    db.insert_data(bgg.games)
 
-    qdrant = Qdrant(client, db, model, verbose)
-    if verbose:
-        print("Create Qdrant collection")
-    qdrant.create_collection()
-    if verbose:
-        print("Insert data into Qdrant collection")
-    qdrant.insert_collection(with_expansions)
-    if verbose:
-        print("Delete old entries from the Qdrant collection")
-    qdrant.delete_old_entries(game_ids)
+def open_vector_store(db: Database, verbose: bool = False):
+    if VECTOR_STORE == "local":
+        from .local_store import LocalVectorStore
+
+        return LocalVectorStore(db, verbose)
+    if VECTOR_STORE != "qdrant":
+        raise EnvironmentError(
+            f"Unknown VECTOR_STORE {VECTOR_STORE}, use qdrant or local"
+        )
+
+    from .qdrant import Qdrant
+
+    return Qdrant(connect_qdrant(verbose), db, verbose)
 
 
 def run(config: Dict):
-    verbose, fast, refresh_data, expansions = (
-        config.get(key) for key in ["verbose", "fast", "refresh", "expansions"]
+    verbose, fast, refresh_data, expansions, backend, offline, hydrate_only = (
+        config.get(key)
+        for key in [
+            "verbose",
+            "fast",
+            "refresh",
+            "expansions",
+            "backend",
+            "offline",
+            "hydrate",
+        ]
     )
-    encoder = os.environ.get("SENTENCE_TRANFORMER_MODEL", "all-MiniLM-L6-v2")
-
     if verbose:
         print("Initializing database")
     db = Database()
-    if verbose:
-        print("Initializing QdrantClient")
-    try:
-        response = requests.get("http://localhost:6333")
-        response.raise_for_status()
-        client = QdrantClient(host="localhost", port=6333)
-    except requests.RequestException as e:
-        raise ConnectionError(f"Docker Container Qdrant is not running: {e}")
-    if verbose:
-        print("Initializing SentenceTransformerModel")
-    model = SentenceTransformer(
-        encoder,
-        tokenizer_kwargs={
-            "clean_up_tokenization_spaces": False,
-        },
-    )
 
     try:
         match config["mode"]:
@@ -86,11 +56,45 @@ def run(config: Dict):
                 if not bgg_username:
                     raise EnvironmentError("No BGG_USERNAME environment variable found")
 
+                if hydrate_only:
+                    from .ingest import hydrate
+
+                    hydrate(db, bgg_username, backend, offline, verbose)
+                    return
+
+                from .ingest import setup
+
                 setup(
-                    db, client, model, bgg_username, expansions, refresh_data, verbose
+                    db,
+                    open_vector_store(db, verbose),
+                    bgg_username,
+                    expansions,
+                    refresh_data,
+                    backend,
+                    offline,
+                    verbose,
                 )
             case "chat":
-                run_chat(db, client, model, expansions, fast, verbose)
+                from .daemon import CHAT_SOCKET, connect, repl
+
+                # a running daemon answers without loading anything here
+                client = connect(with_expansions=expansions, fast=fast)
+                if client is not None:
+                    if verbose:
+                        print(f"Asking the chat daemon on {CHAT_SOCKET}")
+                    try:
+                        repl(client.ask)
+                    finally:
+                        client.close()
+                    return
+
+                from .chat import run as run_chat
+
+                run_chat(db, open_vector_store(db, verbose), expansions, fast, verbose)
+            case "serve":
+                from .daemon import serve
+
+                serve(db, open_vector_store(db, verbose), expansions, fast, verbose)
             case _:
                 print("Invalid mode")
                 sys.exit(1)
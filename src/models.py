@@ -1,14 +1,49 @@
-from typing import Dict, List
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 
+def _to_int(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True, slots=True)
 class Classification:
-    def __init__(
-        self, bgg_id: int, name: str, bgg_url: str = None, description: str = None
-    ):
-        self.bgg_id = bgg_id
-        self.name = name
-        self.bgg_url = bgg_url
-        self.description = description
+    bgg_id: int
+    name: str
+    bgg_url: str = None
+    description: str = None
+
+    @classmethod
+    def intern(
+        cls, bgg_id: int, name: str, bgg_url: str = None, description: str = None
+    ) -> "Classification":
+        # a few hundred classifications are shared by thousands of games
+        key = (cls, bgg_id)
+        classification = _interned.get(key)
+        if classification is None or (
+            classification.name,
+            classification.bgg_url,
+            classification.description,
+        ) != (name, bgg_url, description):
+            classification = _interned[key] = cls(bgg_id, name, bgg_url, description)
+        return classification
 
     def to_dict(self) -> Dict:
         return {
@@ -25,55 +60,71 @@ class Classification:
         return "Classification"
 
 
+_interned: Dict[Tuple[type, int], Classification] = {}
+
+
+@dataclass(frozen=True, slots=True)
 class Category(Classification):
     def get_type(self) -> str:
         return "Category"
 
 
+@dataclass(frozen=True, slots=True)
 class Type(Classification):
     def get_type(self) -> str:
         return "Type"
 
 
+@dataclass(frozen=True, slots=True)
 class Mechanism(Classification):
     def get_type(self) -> str:
         return "Mechanism"
 
 
+@dataclass(slots=True)
 class Game:
-    def __init__(
-        self,
-        bgg_id: int,
-        title: str,
-        description: str = None,
-        year: int = None,
-        bgg_rating: float = None,
-        complexity: float = None,
-        bgg_url: str = None,
-        image_url: str = None,
-        min_players: int = None,
-        max_players: int = None,
-        min_playtime: int = None,
-        max_playtime: int = None,
-        types: List[Type] = None,
-        categories: List[Category] = None,
-        mechanisms: List[Mechanism] = None,
-    ):
-        self.bgg_id = bgg_id
-        self.title = title
-        self.description = description
-        self.year = year
-        self.bgg_rating = bgg_rating
-        self.complexity = complexity
-        self.bgg_url = bgg_url
-        self.image_url = image_url
-        self.min_players = min_players
-        self.max_players = max_players
-        self.min_playtime = min_playtime
-        self.max_playtime = max_playtime
-        self.types = types if types is not None else []
-        self.categories = categories if categories is not None else []
-        self.mechanisms = mechanisms if mechanisms is not None else []
+    bgg_id: int
+    title: str
+    description: str = None
+    year: int = None
+    bgg_rating: float = None
+    complexity: float = None
+    bgg_url: str = None
+    image_url: str = None
+    min_players: int = None
+    max_players: int = None
+    min_playtime: int = None
+    max_playtime: int = None
+    types: List[Type] = field(default_factory=list)
+    categories: List[Category] = field(default_factory=list)
+    mechanisms: List[Mechanism] = field(default_factory=list)
+    expansion: bool = False
+    content_hash: str = None
+    # the chat reads the descriptions from the database
+    payload_descriptions = (
+        os.environ.get("QDRANT_PAYLOAD_DESCRIPTIONS", False) == "True"
+    )
+
+    def __post_init__(self):
+        # scraped values arrive as strings
+        self.year = _to_int(self.year)
+        self.bgg_rating = _to_float(self.bgg_rating)
+        self.complexity = _to_float(self.complexity)
+        self.min_players = _to_int(self.min_players)
+        self.max_players = _to_int(self.max_players)
+        self.min_playtime = _to_int(self.min_playtime)
+        self.max_playtime = _to_int(self.max_playtime)
+        self.expansion = bool(self.expansion)
+        if self.content_hash is None:
+            self.content_hash = self.hash_content()
+
+    def hash_content(self) -> str:
+        # a point has to be embedded again when its text or payload changes
+        content = self.to_dict(show_description=self.payload_descriptions)
+        content["data_for_vectorization"] = self.data_for_vectorization
+        return hashlib.sha256(
+            json.dumps(content, sort_keys=True).encode("utf-8")
+        ).hexdigest()
 
     @property
     def data_for_vectorization(self) -> str:
@@ -0,0 +1,263 @@
+import os
+import re
+from typing import Dict, List, Tuple
+
+import lxml.html
+from bs4 import BeautifulSoup
+from lxml import etree
+
+Link = Tuple[int, str, str]
+
+PARSER = os.environ.get("BGG_PARSER", "lxml")
+
+
+def _empty_record(bgg_id: int, title: str, bgg_url: str) -> Dict:
+    return {
+        "bgg_id": bgg_id,
+        "title": title,
+        "bgg_url": bgg_url,
+        "expansion": False,
+        "description": None,
+        "year": None,
+        "bgg_rating": None,
+        "complexity": None,
+        "image_url": None,
+        "min_players": None,
+        "max_players": None,
+        "min_playtime": 0,
+        "max_playtime": 0,
+        "types": [],
+        "categories": [],
+        "mechanisms": [],
+    }
+
+
+def extract_links(items: BeautifulSoup, bgg_domain: str) -> List[Link]:
+    return [
+        (
+            int(link["href"].split("/")[2]),
+            link.text.strip(),
+            f"{bgg_domain}{link['href']}",
+        )
+        for link in items.find_all("a", href=True)
+    ]
+
+
+def parse_detail_page_soup(
+    bgg_id: int,
+    title: str,
+    bgg_url: str,
+    rendered_html: str,
+    credits_html: str,
+    bgg_domain: str,
+) -> List[Dict]:
+    soup = BeautifulSoup(rendered_html, "html.parser")
+
+    record = _empty_record(bgg_id, title, bgg_url)
+
+    expansion = soup.find("div", class_="game-header-subtype ng-scope")
+    record["expansion"] = bool(expansion and "Expansion" in expansion.get_text())
+
+    description = soup.find("article", class_="game-description-body")
+    if description:
+        record["description"] = description.get_text(separator="\n").strip()
+
+    year = soup.find("span", class_="game-year")
+    if year:
+        match = re.search(r"\d{4}", year.text)
+        if match:
+            record["year"] = match.group(0)
+
+    bgg_rating = soup.find("span", itemprop="ratingValue")
+    if bgg_rating:
+        record["bgg_rating"] = bgg_rating.text.strip()
+
+    complexity = soup.find("span", {"class": re.compile("gameplay-weight-.*")})
+    if complexity:
+        record["complexity"] = complexity.text.strip()
+
+    players = soup.find("li", itemprop="numberOfPlayers")
+    if players:
+        min_players = players.find("meta", itemprop="minValue")
+        max_players = players.find("meta", itemprop="maxValue")
+        record["min_players"] = min_players["content"] if min_players else None
+        record["max_players"] = max_players["content"] if max_players else None
+
+    gameplay_items = soup.find_all("li", class_="gameplay-item")
+    for gameplay_item in gameplay_items:
+        play_time = gameplay_item.find("h3", string="Play Time")
+        if play_time:
+            min_playtime = gameplay_item.find(
+                "span",
+                class_="ng-binding ng-scope",
+            )
+            if min_playtime:
+                record["min_playtime"] = min_playtime.get_text(strip=True)
+                max_playtime = min_playtime.find_next_sibling()
+                if max_playtime:
+                    record["max_playtime"] = (
+                        max_playtime.get_text(strip=True).split("–")[-1].strip()
+                    )
+                else:
+                    record["max_playtime"] = record["min_playtime"]
+            break
+
+    image = soup.find("img", itemprop="image")
+    if image:
+        record["image_url"] = image["src"]
+
+    game_classification = soup.find("div", class_="game-classification")
+    if game_classification:
+        category = game_classification.find("h4", string=re.compile("Type"))
+        if category:
+            feature_item = category.find_parent("li")
+            if feature_item:
+                record["types"] = extract_links(feature_item, bgg_domain)
+
+    # the credits page lists every category and mechanism instead of "+ 5 more"
+    soup = BeautifulSoup(credits_html, "html.parser")
+
+    game_classification = soup.find_all("li", class_="outline-item ng-scope")
+    for element in game_classification:
+        title_element = element.find("span", id="fullcredits-boardgamecategory")
+        if title_element:
+            record["categories"] = extract_links(element, bgg_domain)
+
+        title_element = element.find("span", id="fullcredits-boardgamemechanic")
+        if title_element:
+            record["mechanisms"] = extract_links(element, bgg_domain)
+
+    return [record]
+
+
+def _has_class(class_name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+def _collapsed(text: str) -> str:
+    # like BeautifulSoup, text of only whitespace becomes one newline or space
+    if text.strip(" \t\n\r\f"):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def _text(element: etree.ElementBase, separator: str = "") -> str:
+    return separator.join(_collapsed(text) for text in element.xpath(".//text()"))
+
+
+def _stripped_text(element: etree.ElementBase) -> str:
+    return "".join(text.strip() for text in element.xpath(".//text()"))
+
+
+def _first(elements: List):
+    return elements[0] if elements else None
+
+
+def _attribute(values: List) -> str:
+    # plain strings do not keep the parsed document alive
+    return str(values[0]) if values else None
+
+
+def _document(content: str) -> etree.ElementBase:
+    if not content:
+        return lxml.html.fromstring("<html></html>")
+    return lxml.html.fromstring(content)
+
+
+def extract_links_lxml(items: etree.ElementBase, bgg_domain: str) -> List[Link]:
+    return [
+        (
+            int(link.get("href").split("/")[2]),
+            _text(link).strip(),
+            f"{bgg_domain}{link.get('href')}",
+        )
+        for link in items.xpath(".//a[@href]")
+    ]
+
+
+def parse_detail_page_lxml(
+    bgg_id: int,
+    title: str,
+    bgg_url: str,
+    rendered_html: str,
+    credits_html: str,
+    bgg_domain: str,
+) -> List[Dict]:
+    document = _document(rendered_html)
+    record = _empty_record(bgg_id, title, bgg_url)
+
+    expansion = _first(document.xpath("//div[@class='game-header-subtype ng-scope']"))
+    record["expansion"] = expansion is not None and "Expansion" in _text(expansion)
+
+    description = _first(
+        document.xpath(f"//article[{_has_class('game-description-body')}]")
+    )
+    if description is not None:
+        record["description"] = _text(description, separator="\n").strip()
+
+    year = _first(document.xpath(f"//span[{_has_class('game-year')}]"))
+    if year is not None:
+        match = re.search(r"\d{4}", _text(year))
+        if match:
+            record["year"] = match.group(0)
+
+    bgg_rating = _first(document.xpath("//span[@itemprop='ratingValue']"))
+    if bgg_rating is not None:
+        record["bgg_rating"] = _text(bgg_rating).strip()
+
+    complexity = _first(document.xpath("//span[contains(@class, 'gameplay-weight-')]"))
+    if complexity is not None:
+        record["complexity"] = _text(complexity).strip()
+
+    players = _first(document.xpath("//li[@itemprop='numberOfPlayers']"))
+    if players is not None:
+        record["min_players"] = _attribute(
+            players.xpath(".//meta[@itemprop='minValue']/@content")
+        )
+        record["max_players"] = _attribute(
+            players.xpath(".//meta[@itemprop='maxValue']/@content")
+        )
+
+    play_time = _first(
+        document.xpath(f"//li[{_has_class('gameplay-item')}][.//h3[.='Play Time']]")
+    )
+    if play_time is not None:
+        min_playtime = _first(play_time.xpath(".//span[@class='ng-binding ng-scope']"))
+        if min_playtime is not None:
+            record["min_playtime"] = _stripped_text(min_playtime)
+            max_playtime = next(min_playtime.itersiblings(etree.Element), None)
+            if max_playtime is not None:
+                record["max_playtime"] = (
+                    _stripped_text(max_playtime).split("–")[-1].strip()
+                )
+            else:
+                record["max_playtime"] = record["min_playtime"]
+
+    image = _attribute(document.xpath("//img[@itemprop='image']/@src"))
+    if image:
+        record["image_url"] = image
+
+    feature_item = _first(
+        document.xpath(
+            f"(//div[{_has_class('game-classification')}])[1]"
+            "//h4[contains(., 'Type')][1]/ancestor::li[1]"
+        )
+    )
+    if feature_item is not None:
+        record["types"] = extract_links_lxml(feature_item, bgg_domain)
+
+    # the credits page lists every category and mechanism instead of "+ 5 more"
+    document = _document(credits_html)
+
+    for element in document.xpath("//li[@class='outline-item ng-scope']"):
+        if element.xpath(".//span[@id='fullcredits-boardgamecategory']"):
+            record["categories"] = extract_links_lxml(element, bgg_domain)
+
+        if element.xpath(".//span[@id='fullcredits-boardgamemechanic']"):
+            record["mechanisms"] = extract_links_lxml(element, bgg_domain)
+
+    return [record]
+
+
+parsers = {"lxml": parse_detail_page_lxml, "soup": parse_detail_page_soup}
+parse_detail_page = parsers[PARSER]
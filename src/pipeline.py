@@ -0,0 +1,179 @@
+import json
+import os
+import queue
+import threading
+from typing import List, Set, Tuple
+
+from .counter import StageCounter
+from .db import Database
+from .models import Game
+from .qdrant import Qdrant
+
+
+class Checkpoint:
+    path = os.environ.get("INGEST_CHECKPOINT", "ingest-checkpoint.json")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.written: Set[int] = set()
+        self.done: Set[int] = set()
+        self.resumed = os.path.exists(self.path)
+        if self.resumed:
+            with open(self.path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            self.written = set(checkpoint["written"])
+            self.done = set(checkpoint["done"])
+
+    def skip_ids(self, game_ids: List[int], refresh_data: bool = False) -> Set[int]:
+        # games written but not upserted before the interruption are fetched again
+        skip_ids = set(self.done)
+        if not refresh_data:
+            skip_ids |= set(game_ids) - (self.written - self.done)
+        return skip_ids
+
+    def mark_written(self, game_ids: List[int]) -> None:
+        with self.lock:
+            self.written.update(game_ids)
+            self._save()
+
+    def mark_done(self, game_ids: List[int]) -> None:
+        with self.lock:
+            self.done.update(game_ids)
+            self._save()
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump(
+                {"written": sorted(self.written), "done": sorted(self.done)},
+                checkpoint_file,
+            )
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class IngestPipeline:
+    batch_size = int(os.environ.get("INGEST_BATCH_SIZE", 32))
+    queue_size = int(os.environ.get("INGEST_QUEUE_SIZE", 128))
+    flush_interval = 2
+
+    def __init__(
+        self,
+        db: Database,
+        qdrant: Qdrant,
+        with_expansions: bool = False,
+        verbose: bool = False,
+    ):
+        self.db = db
+        self.qdrant = qdrant
+        self.with_expansions = with_expansions
+        self.verbose = verbose
+        self.games = queue.Queue(maxsize=self.queue_size)
+        self.batches = queue.Queue(maxsize=max(1, self.queue_size // self.batch_size))
+        self.checkpoint = Checkpoint()
+        self.counters = [
+            StageCounter("written"),
+            StageCounter("embedded"),
+            StageCounter("upserted"),
+        ]
+        self.error = None
+        self.threads = [
+            threading.Thread(target=self._run_stage, args=(self._write,)),
+            threading.Thread(target=self._run_stage, args=(self._embed,)),
+        ]
+
+    def start(self) -> None:
+        for counter in self.counters:
+            counter.start()
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, game: Game) -> None:
+        # blocks while the writer is behind, which slows the scraper down
+        if not self._put(self.games, game):
+            raise self.error
+
+    def close(self, completed: bool = True) -> None:
+        self._put(self.games, None)
+        for thread in self.threads:
+            thread.join()
+        if self.error:
+            raise self.error
+        if completed:
+            self.checkpoint.clear()
+
+    def report(self) -> None:
+        for counter in self.counters:
+            print(counter)
+
+    def _put(self, stage_queue: queue.Queue, item) -> bool:
+        while not self.error:
+            try:
+                stage_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run_stage(self, stage) -> None:
+        try:
+            stage()
+        except Exception as e:
+            self.error = e
+            # unblock the other stages and the producers
+            for stage_queue in (self.games, self.batches):
+                while True:
+                    try:
+                        stage_queue.get_nowait()
+                    except queue.Empty:
+                        break
+            try:
+                self.batches.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def _next_batch(self) -> Tuple[List[Game], bool]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                game = self.games.get(timeout=self.flush_interval)
+            except queue.Empty:
+                break
+            if game is None:
+                return batch, True
+            batch.append(game)
+        return batch, False
+
+    def _write(self) -> None:
+        written, _, _ = self.counters
+        try:
+            finished = False
+            while not finished and not self.error:
+                batch, finished = self._next_batch()
+                if not batch:
+                    continue
+                self.db.insert_data(batch)
+                self.checkpoint.mark_written([game.bgg_id for game in batch])
+                written.add(len(batch))
+                self._put(self.batches, batch)
+        finally:
+            self._put(self.batches, None)
+
+    def _embed(self) -> None:
+        _, embedded, upserted = self.counters
+        while True:
+            batch = self.batches.get()
+            if batch is None or self.error:
+                return
+            # the collection contains either games or expansions like Database.get_games
+            games = [
+                game for game in batch if game.expansion == bool(self.with_expansions)
+            ]
+            if games:
+                synced = self.qdrant.sync_points(games)
+                embedded.add(synced)
+                upserted.add(synced)
+            self.checkpoint.mark_done([game.bgg_id for game in batch])
@@ -1,80 +1,561 @@
+import hashlib
+import json
 import os
-from typing import List
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Set, Tuple
 
 from qdrant_client import QdrantClient, models
 from qdrant_client.models import Distance, OrderBy, PointStruct, VectorParams
-from sentence_transformers import SentenceTransformer
 
 from .db import Database
+from .embeddings import EmbeddingService
+from .encoder import ENCODER_KEY, ENCODER_NAME, get_encoder
+from .models import Game
+
+QDRANT_HOST = os.environ.get("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.environ.get("QDRANT_PORT", 6333))
+QDRANT_GRPC_PORT = int(os.environ.get("QDRANT_GRPC_PORT", 6334))
+QDRANT_PREFER_GRPC = os.environ.get("QDRANT_PREFER_GRPC", "True") == "True"
+
+_client = None
+_lock = threading.Lock()
+
+# typed payload fields of the chat filters, indexed when the collection is created
+PAYLOAD_SCHEMA = {
+    "year": models.PayloadSchemaType.INTEGER,
+    "min_players": models.PayloadSchemaType.INTEGER,
+    "max_players": models.PayloadSchemaType.INTEGER,
+    "min_playtime": models.PayloadSchemaType.INTEGER,
+    "max_playtime": models.PayloadSchemaType.INTEGER,
+    "bgg_rating": models.PayloadSchemaType.FLOAT,
+    "complexity": models.PayloadSchemaType.FLOAT,
+    "types": models.PayloadSchemaType.KEYWORD,
+    "categories": models.PayloadSchemaType.KEYWORD,
+    "mechanisms": models.PayloadSchemaType.KEYWORD,
+}
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    quantization: Optional[str] = None
+    on_disk: bool = False
+    on_disk_payload: bool = False
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_ef: Optional[int] = None
+    rescore: bool = True
+    oversampling: Optional[float] = None
+
+    def vectors_config(self, size: int) -> VectorParams:
+        return VectorParams(size=size, distance=Distance.COSINE, on_disk=self.on_disk)
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self):
+        # the quantized vectors stay in memory, the originals only for rescoring
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+                )
+            )
+        if self.quantization == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            )
+        return None
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        if self.quantization is None and self.hnsw_ef is None:
+            return None
+        quantization = None
+        if self.quantization is not None:
+            quantization = models.QuantizationSearchParams(
+                rescore=self.rescore, oversampling=self.oversampling
+            )
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def changes(self, config: models.CollectionConfig) -> Dict:
+        # settings of an existing collection that differ from the profile
+        changes = {}
+        if (config.hnsw_config.m, config.hnsw_config.ef_construct) != (
+            self.hnsw_m,
+            self.hnsw_ef_construct,
+        ):
+            changes["hnsw_config"] = self.hnsw_config()
+        quantization = None
+        if isinstance(config.quantization_config, models.ScalarQuantization):
+            quantization = "scalar"
+        elif isinstance(config.quantization_config, models.BinaryQuantization):
+            quantization = "binary"
+        elif config.quantization_config is not None:
+            quantization = "product"
+        if quantization != self.quantization:
+            changes["quantization_config"] = (
+                self.quantization_config() or models.Disabled.DISABLED
+            )
+        if bool(config.params.on_disk_payload) != self.on_disk_payload:
+            changes["collection_params"] = models.CollectionParamsDiff(
+                on_disk_payload=self.on_disk_payload
+            )
+        if bool(config.params.vectors.on_disk) != self.on_disk:
+            changes["vectors_config"] = {
+                "": models.VectorParamsDiff(on_disk=self.on_disk)
+            }
+        return changes
+
+
+COLLECTION_PROFILES = {
+    # full float32 vectors and payloads in memory
+    "memory": CollectionProfile(),
+    # int8 vectors in memory, a quarter of the memory at almost the same recall
+    "scalar": CollectionProfile(quantization="scalar", oversampling=2.0),
+    # one bit per dimension in memory, needs rescoring with the original vectors
+    "binary": CollectionProfile(quantization="binary", oversampling=3.0),
+    # int8 vectors in memory, original vectors and payloads on disk
+    "disk": CollectionProfile(
+        quantization="scalar",
+        on_disk=True,
+        on_disk_payload=True,
+        oversampling=2.0,
+    ),
+    # smaller graph for many small collections on one instance
+    "compact": CollectionProfile(
+        quantization="scalar",
+        on_disk=True,
+        on_disk_payload=True,
+        hnsw_m=8,
+        hnsw_ef_construct=64,
+        oversampling=2.0,
+    ),
+}
+
+
+def collection_profile(
+    name: str = os.environ.get("QDRANT_COLLECTION_PROFILE", "memory")
+) -> CollectionProfile:
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(
+            f"Unknown QDRANT_COLLECTION_PROFILE {name}, "
+            f"use one of {', '.join(COLLECTION_PROFILES)}"
+        )
+    profile = COLLECTION_PROFILES[name]
+    overrides = {}
+    for field_name, env_name, cast in [
+        ("hnsw_m", "QDRANT_HNSW_M", int),
+        ("hnsw_ef_construct", "QDRANT_HNSW_EF_CONSTRUCT", int),
+        ("hnsw_ef", "QDRANT_HNSW_EF", int),
+        ("oversampling", "QDRANT_OVERSAMPLING", float),
+    ]:
+        if os.environ.get(env_name):
+            overrides[field_name] = cast(os.environ[env_name])
+    if os.environ.get("QDRANT_RESCORE"):
+        overrides["rescore"] = os.environ["QDRANT_RESCORE"] == "True"
+    return replace(profile, **overrides)
+
+
+def get_client() -> QdrantClient:
+    # one connection per process, shared by the ingest, the uploads and the chat
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                client = QdrantClient(
+                    host=QDRANT_HOST,
+                    port=QDRANT_PORT,
+                    grpc_port=QDRANT_GRPC_PORT,
+                    prefer_grpc=QDRANT_PREFER_GRPC,
+                )
+                try:
+                    client.get_collections()
+                except Exception as e:
+                    client.close()
+                    raise ConnectionError(
+                        f"Docker Container Qdrant is not running: {e}"
+                    )
+                _client = client
+    return _client
+
+
+def collection_version(
+    alias: str, model_name: str = ENCODER_KEY, payload_descriptions: bool = False
+) -> str:
+    # points of another model or payload schema go into a new collection
+    schema = json.dumps(
+        {
+            "payload_schema": {
+                key: str(value) for key, value in PAYLOAD_SCHEMA.items()
+            },
+            "payload_descriptions": payload_descriptions,
+        },
+        sort_keys=True,
+    )
+    schema_hash = hashlib.sha256(schema.encode("utf-8")).hexdigest()[:12]
+    return f"{model_prefix(alias, model_name)}{schema_hash}"
+
+
+def model_prefix(alias: str, model_name: str = ENCODER_KEY) -> str:
+    return f"{alias}_{model_name.replace('/', '--')}_"
 
 
 class Qdrant:
+    # alias of the collection the chat reads
     collection_name = "games"
     limit = 5
-    encoder_name = os.environ.get("SENTENCE_TRANFORMER_MODEL", "all-MiniLM-L6-v2")
-    encoder = SentenceTransformer(encoder_name)
+    batch_size = int(os.environ.get("QDRANT_BATCH_SIZE", 256))
+    encoder_name = ENCODER_NAME
+    profile = collection_profile()
+    upload_workers = int(os.environ.get("QDRANT_UPLOAD_WORKERS", 2))
+    upload_batch_size = int(os.environ.get("QDRANT_UPLOAD_BATCH_SIZE", 64))
+    upload_retries = int(os.environ.get("QDRANT_UPLOAD_RETRIES", 3))
+    alias_retries = 3
+    payload_descriptions = Game.payload_descriptions
 
     def __init__(
         self,
         client: QdrantClient,
         db: Database,
-        model: SentenceTransformer,
         verbose: bool = False,
     ):
         self.client = client
         self.db = db
-        self.model = model
         self.game_ids = []
         self.verbose = verbose
+        self.embeddings = EmbeddingService(verbose=verbose)
+        self.content_hashes: Dict[int, Optional[str]] = {}
+        self.synced: Set[int] = set()
+        self.added = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.version_name = collection_version(
+            self.collection_name, payload_descriptions=self.payload_descriptions
+        )
+        # the ingest writes into the version, the chat reads the alias
+        self.write_name = self.version_name
+        self.building = False
+        self.uploader: Optional[ThreadPoolExecutor] = None
+        self.uploads: List[Future] = []
+        self.upload_lock = threading.Lock()
+        self.uploaded = 0
+        self.upload_duration = 0.0
 
-    def create_collection(self):
-        collection = self.client.collection_exists(self.collection_name)
+    def live_collection(self) -> Optional[str]:
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return None
+
+    def create_collection(self) -> bool:
+        # a new version is built next to the live collection and published
+        # when it is complete, an interrupted build is continued
+        self.building = self.live_collection() != self.version_name
+        collection = self.client.collection_exists(self.version_name)
         if not collection:
-            print("Creating collection")
+            print(f"Creating collection {self.version_name}")
 
             self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(
-                    size=self.encoder.get_sentence_embedding_dimension(),  # Vector size is defined by used model
-                    distance=Distance.COSINE,
+                collection_name=self.version_name,
+                vectors_config=self.profile.vectors_config(
+                    get_encoder().get_sentence_embedding_dimension()  # Vector size is defined by used model
                 ),
+                hnsw_config=self.profile.hnsw_config(),
+                quantization_config=self.profile.quantization_config(),
+                on_disk_payload=self.profile.on_disk_payload,
             )
+        else:
+            self.update_profile()
+        self.create_payload_indexes()
+        return not collection
 
-    def insert_collection(self, with_expansions: bool = False):
-        all_games = self.db.get_games(with_expansions)
+    def update_profile(self):
+        # Qdrant rebuilds the changed parts of an existing collection in the background
+        config = self.client.get_collection(self.write_name).config
+        changes = self.profile.changes(config)
+        if changes:
+            print(f"Updating collection settings: {', '.join(changes)}")
+            self.client.update_collection(collection_name=self.write_name, **changes)
 
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=[
-                PointStruct(
-                    id=game.bgg_id,
-                    vector=self.encoder.encode(game.data_for_vectorization).tolist(),
-                    payload=game.to_dict(),
+    def create_payload_indexes(self):
+        # collections created before the schema get the missing indexes
+        payload_schema = self.client.get_collection(self.write_name).payload_schema
+        for field_name, field_schema in PAYLOAD_SCHEMA.items():
+            if field_name in payload_schema:
+                continue
+            self.client.create_payload_index(
+                collection_name=self.write_name,
+                field_name=field_name,
+                field_schema=field_schema,
+            )
+
+    def load_content_hashes(self):
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.write_name,
+                limit=self.batch_size,
+                offset=offset,
+                with_payload=["content_hash"],
+                with_vectors=False,
+            )
+            for point in points:
+                self.content_hashes[point.id] = point.payload.get("content_hash")
+            if offset is None:
+                break
+
+    def sync_points(self, games: List[Game]) -> int:
+        # only new and changed games are embedded
+        games_to_upsert = []
+        for game in games:
+            self.synced.add(game.bgg_id)
+            if game.bgg_id not in self.content_hashes:
+                self.added += 1
+            elif self.content_hashes[game.bgg_id] != game.content_hash:
+                self.changed += 1
+            else:
+                self.unchanged += 1
+                continue
+            games_to_upsert.append(game)
+        if games_to_upsert:
+            self.upload(self.encode_points(games_to_upsert))
+            for game in games_to_upsert:
+                self.content_hashes[game.bgg_id] = game.content_hash
+        return len(games_to_upsert)
+
+    def sync_collection(self, with_expansions: bool = False):
+        # games that were not streamed during this run, e.g. for a new collection
+        content_hashes = self.db.get_content_hashes(with_expansions)
+        stale_ids = set()
+        for bgg_id, content_hash in content_hashes.items():
+            if bgg_id in self.synced:
+                continue
+            # rows and points from before the hashes are synced once
+            if content_hash is not None and self.content_hashes.get(bgg_id) == (
+                content_hash
+            ):
+                self.unchanged += 1
+                self.synced.add(bgg_id)
+            else:
+                stale_ids.add(bgg_id)
+        if stale_ids:
+            # only the stale games are loaded, the hashes decided which ones
+            missing_hashes = {}
+            stale_ids = sorted(stale_ids)
+            for i in range(0, len(stale_ids), self.batch_size):
+                games = self.db.get_games(
+                    with_expansions, bgg_ids=stale_ids[i : i + self.batch_size]
                 )
-                for game in all_games
-            ],
+                self.sync_points(games)
+                for game in games:
+                    if content_hashes[game.bgg_id] is None:
+                        missing_hashes[game.bgg_id] = game.content_hash
+            if missing_hashes:
+                self.db.update_content_hashes(missing_hashes)
+        self.wait_uploads()
+
+        # the points of the other expansion flag stay, only games that are
+        # no longer in the database are removed
+        game_ids = set(self.db.get_game_ids())
+        removed_ids = [
+            bgg_id for bgg_id in self.content_hashes if bgg_id not in game_ids
+        ]
+        for i in range(0, len(removed_ids), self.batch_size):
+            self.delete_points(removed_ids[i : i + self.batch_size])
+        for bgg_id in removed_ids:
+            del self.content_hashes[bgg_id]
+        self.removed += len(removed_ids)
+
+    def encode_points(self, games: List[Game]) -> List[PointStruct]:
+        vectors = self.embeddings.encode(
+            [game.data_for_vectorization for game in games]
+        )
+        return [
+            PointStruct(
+                id=game.bgg_id,
+                vector=vector.tolist(),
+                payload={
+                    **game.to_dict(show_description=self.payload_descriptions),
+                    "content_hash": game.content_hash,
+                },
+            )
+            for game, vector in zip(games, vectors)
+        ]
+
+    def upload(self, points: List[PointStruct]):
+        # the next batch is encoded while the previous ones are uploaded
+        if not self.upload_workers:
+            self.upsert_points(points)
+            return
+        if self.uploader is None:
+            self.uploader = ThreadPoolExecutor(max_workers=self.upload_workers)
+        while len(self.uploads) >= 2 * self.upload_workers:
+            self.uploads.pop(0).result()
+        self.uploads.append(self.uploader.submit(self.upsert_points, points))
+
+    def wait_uploads(self):
+        while self.uploads:
+            self.uploads.pop(0).result()
+
+    def upsert_points(self, points: List[PointStruct]):
+        # small requests with retries instead of one body per batch that can time out
+        start = time.perf_counter()
+        self.client.upload_points(
+            collection_name=self.write_name,
+            points=points,
+            batch_size=self.upload_batch_size,
+            max_retries=self.upload_retries,
+            wait=True,
         )
+        with self.upload_lock:
+            self.uploaded += len(points)
+            self.upload_duration += time.perf_counter() - start
 
-    def delete_old_entries(self, game_ids: List[int]):
+    def delete_points(self, point_ids: List[int]):
         self.client.delete(
-            collection_name=self.collection_name,
-            points_selector=models.Filter(
-                must_not=[
-                    models.FieldCondition(
-                        key="bgg_id",
-                        match=models.MatchAny(any=game_ids),
-                    )
-                ]
-            ),
+            collection_name=self.write_name,
+            points_selector=models.PointIdsList(points=point_ids),
         )
 
+    def publish(self):
+        # the alias is moved in one request, the chat reads the old or the new
+        # version but never a partial one
+        self.wait_uploads()
+        if not self.building:
+            return
+        live = self.live_collection()
+        if live is None and self.client.collection_exists(self.collection_name):
+            self.migrate_legacy_collection()
+        operations = []
+        if live is not None:
+            operations.append(
+                models.DeleteAliasOperation(
+                    delete_alias=models.DeleteAlias(alias_name=self.collection_name)
+                )
+            )
+        operations.append(
+            models.CreateAliasOperation(
+                create_alias=models.CreateAlias(
+                    collection_name=self.version_name,
+                    alias_name=self.collection_name,
+                )
+            )
+        )
+        for attempt in range(self.alias_retries):
+            try:
+                self.client.update_collection_aliases(
+                    change_aliases_operations=operations
+                )
+                break
+            except Exception as e:
+                # the name of a removed collection can be taken a moment later
+                if attempt == self.alias_retries - 1:
+                    raise
+                print(f"Creating alias {self.collection_name} failed, retry: {e}")
+                time.sleep(1)
+        print(f"Collection {self.collection_name} now serves {self.version_name}")
+        self.building = False
+        self.remove_old_versions(keep=live)
+
+    def migrate_legacy_collection(self):
+        # once: a collection from before the versions has the name of the
+        # alias, searches between its removal and the alias fail
+        print(
+            f"Replacing collection {self.collection_name} from before the versions "
+            f"with an alias to {self.version_name}"
+        )
+        self.client.delete_collection(self.collection_name)
+
+    def remove_old_versions(self, keep: Optional[str] = None):
+        # the previous version stays for chats that still search it, versions
+        # an alias points to are never removed
+        aliased = {alias.collection_name for alias in self.client.get_aliases().aliases}
+        for collection in self.client.get_collections().collections:
+            if (
+                collection.name.startswith(f"{self.collection_name}_")
+                and collection.name not in (self.version_name, keep)
+                and collection.name not in aliased
+            ):
+                print(f"Removing collection {collection.name}")
+                self.client.delete_collection(collection.name)
+
+    def index_version(self) -> Optional[str]:
+        # moves when the ingest publishes a new version
+        return self.live_collection()
+
+    def reload(self):
+        # the searches follow the alias, only the model has to match
+        self.check_version()
+
+    def check_version(self):
+        # vectors of another model can not be searched with this encoder
+        live = self.live_collection()
+        if live is not None and not live.startswith(model_prefix(self.collection_name)):
+            raise EnvironmentError(
+                f"Collection {self.collection_name} serves {live}, which was built "
+                f"with another model than {ENCODER_KEY}, run ./main.py db first"
+            )
+
+    def report(self):
+        print(
+            f"Qdrant points: {self.added} added, {self.changed} changed, "
+            f"{self.unchanged} unchanged, {self.removed} removed"
+        )
+        if self.uploaded:
+            rate = self.uploaded / self.upload_duration
+            print(
+                f"Qdrant upload: {self.uploaded} points in {self.upload_duration:.2f}s "
+                f"of requests ({rate:.1f} points/s per worker, "
+                f"{max(self.upload_workers, 1)} workers)"
+            )
+
     def client_search(self, query_filter: models.Filter, query_vector: List[float]):
         return self.client.search(
             collection_name=self.collection_name,
             limit=self.limit,
             query_filter=query_filter,
             query_vector=query_vector,
+            search_params=self.profile.search_params(),
+        )
+
+    def search_tiers(
+        self,
+        filters: List[models.Filter],
+        query_vector: Optional[List[float]] = None,
+        batch: bool = True,
+    ) -> Tuple[List, Optional[int]]:
+        # the filters get looser from tier to tier, the first tier with results
+        # answers, without a query vector the points are ordered by id
+        if not batch:
+            for tier, query_filter in enumerate(filters):
+                if query_vector is None:
+                    points, _ = self.client_scroll(query_filter)
+                else:
+                    points = self.client_search(query_filter, query_vector)
+                if points:
+                    return points, tier
+            return [], None
+
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[
+                models.QueryRequest(
+                    query=query_vector,
+                    filter=query_filter,
+                    params=self.profile.search_params(),
+                    limit=self.limit,
+                    with_payload=True,
+                )
+                for query_filter in filters
+            ],
         )
+        for tier, response in enumerate(responses):
+            if response.points:
+                return response.points, tier
+        return [], None
 
     def client_scroll(self, scroll_filter: models.Filter):
         return self.client.scroll(
@@ -0,0 +1,73 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .models import Category, Classification, Mechanism, Type
+
+
+class ClassificationRegistry:
+    class_map = {"type": Type, "category": Category, "mechanism": Mechanism}
+
+    def __init__(
+        self,
+        fetch: Callable[[Classification, str], Optional[Classification]],
+        verbose: bool = False,
+    ):
+        self.fetch = fetch
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.classifications: Dict[Tuple[str, int], Optional[Classification]] = {}
+        self.in_flight: Dict[Tuple[str, int], Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def load(self, rows: List[Dict]) -> None:
+        with self.lock:
+            for row in rows:
+                classification_class = self.class_map[row["classification"]]
+                self.classifications[(row["classification"], row["bgg_id"])] = (
+                    classification_class.intern(
+                        row["bgg_id"], row["name"], row["bgg_url"], row["description"]
+                    )
+                )
+
+    def resolve(
+        self, classification: Classification, category_name: str
+    ) -> Optional[Classification]:
+        key = (category_name.lower(), classification.bgg_id)
+        with self.lock:
+            if key in self.classifications:
+                self.hits += 1
+                return self.classifications[key]
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self.in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            # another thread is already fetching this classification
+            return future.result()
+
+        try:
+            resolved = self.fetch(classification, category_name)
+        except Exception as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            self.classifications[key] = resolved
+            del self.in_flight[key]
+        future.set_result(resolved)
+        return resolved
+
+    def report(self) -> None:
+        print(
+            f"Classifications: {self.hits} hits, {self.misses} misses, "
+            f"{self.coalesced} coalesced"
+        )
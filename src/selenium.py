@@ -1,9 +1,16 @@
 import os
+import queue
 import sys
+import threading
+from contextlib import contextmanager
+from typing import Iterator
 
 from selenium import webdriver
-from selenium.common.exceptions import WebDriverException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
 
 CHROMEDRIVER_PATH = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
@@ -13,29 +20,130 @@ CHROMEDRIVER_PATH = os.path.join(
 
 sys.path.insert(0, CHROMEDRIVER_PATH)
 
+# resources which are not needed for reading the rendered html
+BLOCKED_URLS = [
+    "*.css",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.svg",
+    "*.webp",
+]
 
-class Selenium:
 
-    def __init__(self, url: str):
-        self.url = url
-        self.driver = None
-        self._create_driver()
+def create_driver() -> webdriver.Chrome:
+    service = Service(executable_path=CHROMEDRIVER_PATH)
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option(
+        "prefs",
+        {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.stylesheets": 2,
+            "profile.managed_default_content_settings.fonts": 2,
+        },
+    )
+    # return after DOMContentLoaded instead of waiting for every resource
+    options.page_load_strategy = "eager"
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    return driver
 
-    def _create_driver(self):
-        service = Service(executable_path=CHROMEDRIVER_PATH)
-        options = webdriver.ChromeOptions()
-        options.add_argument("--headless")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        self.driver = webdriver.Chrome(service=service, options=options)
 
-    def get_html_content(self) -> str:
+class PooledDriver:
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.pages = 0
+
+    def quit(self):
         try:
-            self.driver.get(self.url)
-            rendered_html = self.driver.page_source
-        except WebDriverException as e:
-            print(f"Error fetching URL {self.url}: {e}")
-            rendered_html = ""
-        finally:
             self.driver.quit()
-        return rendered_html
+        except WebDriverException:
+            pass
+
+
+class SeleniumPool:
+    size = int(os.environ.get("SELENIUM_POOL_SIZE", min(8, os.cpu_count() or 1)))
+    max_pages = int(os.environ.get("SELENIUM_MAX_PAGES", 50))
+    wait_timeout = int(os.environ.get("SELENIUM_WAIT_TIMEOUT", 10))
+
+    def __init__(self, size: int = None, max_pages: int = None, verbose: bool = False):
+        if size is not None:
+            self.size = size
+        if max_pages is not None:
+            self.max_pages = max_pages
+        self.verbose = verbose
+        self.idle_drivers = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @contextmanager
+    def driver(self) -> Iterator[webdriver.Chrome]:
+        with self.slots:
+            try:
+                pooled_driver = self.idle_drivers.get_nowait()
+            except queue.Empty:
+                if self.verbose:
+                    print("Starting new chrome driver")
+                pooled_driver = PooledDriver(create_driver())
+
+            healthy = True
+            try:
+                yield pooled_driver.driver
+            except WebDriverException:
+                healthy = False
+                raise
+            finally:
+                pooled_driver.pages += 1
+                self._release(pooled_driver, healthy)
+
+    def _release(self, pooled_driver: PooledDriver, healthy: bool):
+        if self.closed or not healthy or pooled_driver.pages >= self.max_pages:
+            if self.verbose and not healthy:
+                print("Recycle crashed chrome driver")
+            pooled_driver.quit()
+            return
+        self.idle_drivers.put(pooled_driver)
+
+    def get_html_content(self, url: str, wait_for: str = None) -> str:
+        try:
+            with self.driver() as driver:
+                driver.get(url)
+                if wait_for:
+                    # the eager page load strategy returns before angular has rendered
+                    try:
+                        WebDriverWait(driver, self.wait_timeout).until(
+                            expected_conditions.presence_of_element_located(
+                                (By.CSS_SELECTOR, wait_for)
+                            )
+                        )
+                    except TimeoutException:
+                        if self.verbose:
+                            print(f"Timeout waiting for {wait_for} on {url}")
+                return driver.page_source
+        except WebDriverException as e:
+            print(f"Error fetching URL {url}: {e}")
+            return ""
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.idle_drivers.get_nowait().quit()
+            except queue.Empty:
+                break
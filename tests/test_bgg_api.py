@@ -0,0 +1,128 @@
+import os
+import unittest
+
+from src.bgg import BGG
+from src.bgg_api import BGGApi, BGGUserError, parse_collection, parse_things
+
+BGG_DOMAIN = "https://boardgamegeek.com"
+API_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "api")
+
+
+def response_content(file_name: str) -> str:
+    with open(os.path.join(API_PATH, file_name), encoding="utf-8") as response_file:
+        return response_file.read()
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+class ParseCollectionTest(unittest.TestCase):
+    def test_games_of_the_collection(self):
+        game_urls = parse_collection(response_content("collection.xml"), BGG_DOMAIN)
+        self.assertEqual(
+            game_urls,
+            [
+                (224517, "Brass: Birmingham", f"{BGG_DOMAIN}/boardgame/224517"),
+                (
+                    252446,
+                    "Wingspan: European Expansion",
+                    f"{BGG_DOMAIN}/boardgame/252446",
+                ),
+                (98778, "Hanabi", f"{BGG_DOMAIN}/boardgame/98778"),
+            ],
+        )
+
+    def test_invalid_username(self):
+        with self.assertRaises(BGGUserError):
+            parse_collection(
+                response_content("collection_invalid_username.xml"), BGG_DOMAIN
+            )
+
+
+class ParseThingsTest(unittest.TestCase):
+    def setUp(self):
+        records = parse_things(
+            response_content("thing.xml"), BGG_DOMAIN, {224517: "Brass"}
+        )
+        self.records = {record["bgg_id"]: record for record in records}
+
+    def test_game(self):
+        record = self.records[224517]
+        self.assertEqual(record["title"], "Brass")
+        self.assertFalse(record["expansion"])
+        self.assertEqual(record["year"], "2018")
+        self.assertEqual(record["bgg_rating"], "8.6")
+        self.assertEqual(record["complexity"], "3.87")
+        self.assertEqual((record["min_players"], record["max_players"]), ("2", "4"))
+        self.assertEqual(
+            (record["min_playtime"], record["max_playtime"]), ("60", "120")
+        )
+        self.assertTrue(record["description"].startswith("Brass: Birmingham is an"))
+        self.assertIn("Martin Wallace' 2007", record["description"])
+        self.assertIn("\n\n", record["description"])
+        self.assertEqual(
+            [category[1] for category in record["categories"]],
+            ["Economic", "Industry / Manufacturing", "Transportation"],
+        )
+        self.assertEqual(
+            [mechanism[1] for mechanism in record["mechanisms"]],
+            ["Contracts", "Hand Management", "Network and Route Building"],
+        )
+
+    def test_types_from_family_ranks(self):
+        self.assertEqual(
+            self.records[224517]["types"],
+            [(5497, "Strategy", f"{BGG_DOMAIN}/boardgamesubdomain/5497")],
+        )
+
+    def test_types_from_subdomain_links(self):
+        self.assertEqual(
+            self.records[98778]["types"],
+            [
+                (5499, "Family", f"{BGG_DOMAIN}/boardgamesubdomain/5499"),
+                (5498, "Party", f"{BGG_DOMAIN}/boardgamesubdomain/5498"),
+            ],
+        )
+
+    def test_expansion(self):
+        record = self.records[252446]
+        self.assertEqual(record["title"], "Wingspan: European Expansion")
+        self.assertTrue(record["expansion"])
+        self.assertEqual(record["types"], [])
+        self.assertEqual(record["bgg_rating"], "8.2")
+
+
+class BGGApiTest(unittest.TestCase):
+    def test_retries_while_queued(self):
+        api = BGGApi(BGG_DOMAIN)
+        api.queued_delay = 0
+        responses = [
+            FakeResponse(202, response_content("collection_queued.xml")),
+            FakeResponse(202, response_content("collection_queued.xml")),
+            FakeResponse(200, response_content("collection.xml")),
+        ]
+        api.session.get = lambda url, headers=None, timeout=None: responses.pop(0)
+        self.assertEqual(len(api.get_collection("user")), 3)
+        self.assertEqual(responses, [])
+        api.close()
+
+    def test_invalid_username_does_not_fall_back_to_selenium(self):
+        bgg = BGG("user")
+        bgg.api.cache = None
+        bgg.api.session.get = lambda url, headers=None, timeout=None: FakeResponse(
+            200, response_content("collection_invalid_username.xml")
+        )
+        with self.assertRaises(BGGUserError):
+            bgg.get_data_from_collection()
+        self.assertIsNone(bgg._selenium)
+
+
+if __name__ == "__main__":
+    unittest.main()
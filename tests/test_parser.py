@@ -0,0 +1,77 @@
+import os
+import unittest
+
+from benchmarks.parse_pages import recorded_pages
+from src.cache import PageCache
+from src.parser import parse_detail_page_lxml, parse_detail_page_soup
+
+BGG_DOMAIN = "https://boardgamegeek.com"
+PAGES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+
+
+def fixture_pages():
+    # every detail page has a credits page next to it
+    pages = []
+    for file_name in sorted(os.listdir(PAGES_PATH)):
+        if file_name.endswith("_credits.html"):
+            continue
+        bgg_id = int(file_name.split(".")[0])
+        with open(os.path.join(PAGES_PATH, file_name), encoding="utf-8") as page_file:
+            detail = page_file.read()
+        credits_path = os.path.join(PAGES_PATH, f"{bgg_id}_credits.html")
+        with open(credits_path, encoding="utf-8") as page_file:
+            credits = page_file.read()
+        pages.append(
+            (
+                bgg_id,
+                "",
+                f"{BGG_DOMAIN}/boardgame/{bgg_id}",
+                detail,
+                credits,
+                BGG_DOMAIN,
+            )
+        )
+    return pages
+
+
+class ParserTest(unittest.TestCase):
+    def test_parsers_return_the_same_records(self):
+        pages = fixture_pages()
+        self.assertTrue(pages)
+        for page in pages:
+            with self.subTest(bgg_id=page[0]):
+                records = parse_detail_page_soup(*page)
+                self.assertEqual(parse_detail_page_lxml(*page), records)
+                self.assertTrue(records[0]["description"])
+                self.assertTrue(records[0]["categories"])
+                self.assertTrue(records[0]["mechanisms"])
+
+    def test_parsers_return_the_same_records_for_cached_pages(self):
+        # the pages that ./main.py db -b selenium recorded in the page cache
+        pages = recorded_pages(PageCache(offline=True))
+        if not pages:
+            self.skipTest("no recorded pages in the page cache")
+        for page in pages:
+            with self.subTest(url=page[2]):
+                self.assertEqual(
+                    parse_detail_page_lxml(*page), parse_detail_page_soup(*page)
+                )
+
+    def test_expansion_and_play_time(self):
+        records = {
+            page[0]: parse_detail_page_lxml(*page)[0] for page in fixture_pages()
+        }
+        self.assertTrue(records[252446]["expansion"])
+        self.assertFalse(records[224517]["expansion"])
+        self.assertEqual(
+            (records[224517]["min_playtime"], records[224517]["max_playtime"]),
+            ("60", "120"),
+        )
+        self.assertEqual(
+            (records[98778]["min_playtime"], records[98778]["max_playtime"]),
+            ("25", "25"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
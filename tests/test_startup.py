@@ -0,0 +1,14 @@
+import unittest
+
+from benchmarks.import_time import HEAVY_MODULES, import_times
+
+
+class StartupTest(unittest.TestCase):
+    def test_help_does_not_import_heavy_modules(self):
+        # python -X importtime main.py --help in a subprocess
+        _, modules = import_times(["--help"])
+        self.assertEqual([module for module in HEAVY_MODULES if module in modules], [])
+
+
+if __name__ == "__main__":
+    unittest.main()